@@ -4,19 +4,37 @@ from playwright.sync_api import BrowserContext, Page, Playwright, sync_playwrigh
 
 from .config import AppConfig
 
+CHROMIUM_ARGS = (
+    "--disable-dev-shm-usage",
+    "--disable-gpu",
+    "--disable-extensions",
+    "--disable-background-networking",
+    "--disable-features=Translate,BackForwardCache",
+    "--no-first-run",
+    "--no-default-browser-check",
+)
+
 
 def start_browser(config: AppConfig) -> tuple[Playwright, BrowserContext, Page]:
     playwright = sync_playwright().start()
-    context = playwright.chromium.launch_persistent_context(
-        user_data_dir=str(config.user_data_dir),
-        headless=config.headless,
-        slow_mo=config.slow_mo_ms,
-    )
-    context.set_default_timeout(config.timeout_ms)
+    if config.cdp_endpoint:
+        browser = playwright.chromium.connect_over_cdp(config.cdp_endpoint)
+        context = browser.contexts[0] if browser.contexts else browser.new_context()
+    else:
+        context = playwright.chromium.launch_persistent_context(
+            user_data_dir=str(config.user_data_dir),
+            headless=config.headless,
+            slow_mo=config.slow_mo_ms,
+            args=list(CHROMIUM_ARGS),
+        )
+    context.set_default_navigation_timeout(config.timeout_ms)
+    context.set_default_timeout(config.action_timeout_ms)
     page = context.pages[0] if context.pages else context.new_page()
     return playwright, context, page
 
 
 def close_browser(playwright: Playwright, context: BrowserContext) -> None:
-    context.close()
+    # Persistent contexts have no owning Browser; CDP-attached ones do and must stay alive for the next run.
+    if context.browser is None:
+        context.close()
     playwright.stop()
@@ -0,0 +1,41 @@
+from __future__ import annotations
+
+from urllib.parse import urlparse
+
+from playwright.sync_api import sync_playwright
+
+from .browser import CHROMIUM_ARGS
+from .config import load_browser_settings
+
+
+def main() -> int:
+    try:
+        config = load_browser_settings()
+    except Exception as exc:
+        print(f"Config error: {exc}")
+        return 2
+
+    port = urlparse(config.cdp_endpoint).port if config.cdp_endpoint else None
+    port = port or 9222
+
+    with sync_playwright() as playwright:
+        context = playwright.chromium.launch_persistent_context(
+            user_data_dir=str(config.user_data_dir),
+            headless=config.headless,
+            args=[*CHROMIUM_ARGS, f"--remote-debugging-port={port}"],
+        )
+        print(f"Browser listening on http://127.0.0.1:{port} (Ctrl+C to stop)")
+        try:
+            context.wait_for_event("close", timeout=0)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            try:
+                context.close()
+            except Exception:
+                pass
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,36 +1,36 @@
 from __future__ import annotations
 
 import os
-from dataclasses import dataclass
+import re
+from dataclasses import dataclass, field
 from pathlib import Path
+from typing import Any, Callable, Final, Mapping
 
-from dotenv import load_dotenv
+from dotenv import dotenv_values, load_dotenv
 
+from .utils.logging_utils import mask_card
 
-def _as_bool(value: str | None, default: bool = False) -> bool:
-    if value is None:
-        return default
-    return value.strip().lower() in {"1", "true", "yes", "on"}
+
+_TRUTHY: Final[frozenset[str]] = frozenset({"1", "true", "yes", "on"})
 
 
-def _required(name: str) -> str:
-    value = os.getenv(name, "").strip()
-    if not value:
-        raise ValueError(f"Missing required env var: {name}")
-    return value
+def _as_bool(value: str | None, default: bool = False) -> bool:
+    return default if value is None else value.strip().lower() in _TRUTHY
 
 
-def _optional(name: str, default: str = "") -> str:
-    return os.getenv(name, default).strip()
+def _literal_regex(text: str) -> re.Pattern[str] | None:
+    return re.compile(re.escape(text), re.IGNORECASE) if text else None
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class AppConfig:
     base_url: str
     headless: bool
     slow_mo_ms: int
     timeout_ms: int
+    action_timeout_ms: int
     user_data_dir: Path
+    cdp_endpoint: str
 
     caixa_username: str
     caixa_password: str
@@ -97,66 +97,130 @@ class AppConfig:
     success_text: str
     failure_text: str
 
+    capture_snapshots_on_error: bool
+
+    card_number_masked: str = field(init=False, repr=False)
+    account_menu_regex: re.Pattern[str] = field(init=False, repr=False, compare=False)
+    favorites_entry_regex: re.Pattern[str] | None = field(init=False, repr=False, compare=False)
+    cart_entry_regex: re.Pattern[str] | None = field(init=False, repr=False, compare=False)
+    saved_card_regex: re.Pattern[str] | None = field(init=False, repr=False, compare=False)
 
-def load_config() -> AppConfig:
-    load_dotenv(override=False)
-
-    return AppConfig(
-        base_url=_optional("BASE_URL", "https://www.loteriasonline.caixa.gov.br/silce-web/#/home"),
-        headless=_as_bool(os.getenv("HEADLESS"), default=False),
-        slow_mo_ms=int(_optional("SLOW_MO_MS", "150")),
-        timeout_ms=int(_optional("TIMEOUT_MS", "30000")),
-        user_data_dir=Path(_optional("USER_DATA_DIR", ".playwright-profile")),
-        caixa_username=_required("CAIXA_USERNAME"),
-        caixa_password=_required("CAIXA_PASSWORD"),
-        favorite_item_name_exact=_required("FAVORITE_ITEM_NAME_EXACT"),
-        expected_total=_required("EXPECTED_TOTAL"),
-        card_holder_name=_required("CARD_HOLDER_NAME"),
-        card_number=_required("CARD_NUMBER"),
-        card_exp_month=_required("CARD_EXP_MONTH"),
-        card_exp_year=_required("CARD_EXP_YEAR"),
-        card_cvv=_required("CARD_CVV"),
-        use_saved_card=_as_bool(os.getenv("USE_SAVED_CARD"), default=True),
-        login_username_selector=_optional("LOGIN_USERNAME_SELECTOR"),
-        login_next_selector=_optional("LOGIN_NEXT_SELECTOR"),
-        login_next_text=_optional("LOGIN_NEXT_TEXT", "Próximo"),
-        login_password_selector=_optional("LOGIN_PASSWORD_SELECTOR"),
-        login_submit_selector=_optional("LOGIN_SUBMIT_SELECTOR"),
-        login_otp_input_selector=_optional("LOGIN_OTP_INPUT_SELECTOR"),
-        login_otp_submit_selector=_optional("LOGIN_OTP_SUBMIT_SELECTOR"),
-        cookie_accept_selector=_optional("COOKIE_ACCEPT_SELECTOR"),
-        cookie_accept_text=_optional("COOKIE_ACCEPT_TEXT", "Aceitar"),
-        age_gate_prompt_text=_optional("AGE_GATE_PROMPT_TEXT", "Você tem mais de 18 anos?"),
-        age_gate_confirm_selector=_optional("AGE_GATE_CONFIRM_SELECTOR"),
-        age_gate_confirm_text=_optional("AGE_GATE_CONFIRM_TEXT", "Sim"),
-        access_login_selector=_optional("ACCESS_LOGIN_SELECTOR"),
-        access_login_text=_optional("ACCESS_LOGIN_TEXT", "Acessar"),
-        enter_site_selector=_optional("ENTER_SITE_SELECTOR"),
-        enter_site_text=_optional("ENTER_SITE_TEXT", ""),
-        account_menu_selector=_optional("ACCOUNT_MENU_SELECTOR"),
-        account_menu_text=_optional("ACCOUNT_MENU_TEXT", "Minha Conta"),
-        favorites_entry_selector=_optional("FAVORITES_ENTRY_SELECTOR"),
-        favorites_entry_text=_optional("FAVORITES_ENTRY_TEXT", "Carrinhos favoritos"),
-        favorites_item_selector=_optional("FAVORITES_ITEM_SELECTOR"),
-        favorites_add_button_selector=_optional("FAVORITES_ADD_BUTTON_SELECTOR"),
-        favorites_add_button_text=_optional("FAVORITES_ADD_BUTTON_TEXT", "Adicionar"),
-        cart_entry_selector=_optional("CART_ENTRY_SELECTOR"),
-        cart_entry_text=_optional("CART_ENTRY_TEXT", "Carrinho"),
-        checkout_button_selector=_optional("CHECKOUT_BUTTON_SELECTOR"),
-        checkout_button_text=_optional("CHECKOUT_BUTTON_TEXT", "Finalizar"),
-        total_selector=_optional("TOTAL_SELECTOR"),
-        saved_card_selector=_optional("SAVED_CARD_SELECTOR"),
-        saved_card_text=_optional("SAVED_CARD_TEXT"),
-        saved_card_last4=_optional("SAVED_CARD_LAST4"),
-        card_holder_selector=_optional("CARD_HOLDER_SELECTOR"),
-        card_number_selector=_optional("CARD_NUMBER_SELECTOR"),
-        card_exp_month_selector=_optional("CARD_EXP_MONTH_SELECTOR"),
-        card_exp_year_selector=_optional("CARD_EXP_YEAR_SELECTOR"),
-        card_cvv_selector=_optional("CARD_CVV_SELECTOR"),
-        pay_submit_selector=_optional("PAY_SUBMIT_SELECTOR"),
-        pay_submit_text=_optional("PAY_SUBMIT_TEXT", "Pagar"),
-        payment_otp_input_selector=_optional("PAYMENT_OTP_INPUT_SELECTOR"),
-        payment_otp_submit_selector=_optional("PAYMENT_OTP_SUBMIT_SELECTOR"),
-        success_text=_optional("SUCCESS_TEXT", "Pagamento realizado"),
-        failure_text=_optional("FAILURE_TEXT", "Pagamento recusado"),
-    )
+    def __post_init__(self) -> None:
+        object.__setattr__(self, "card_number_masked", mask_card(self.card_number))
+        account_text = (self.account_menu_text or "Minha Conta").strip() or "Minha Conta"
+        object.__setattr__(self, "account_menu_regex", _literal_regex(account_text))
+        object.__setattr__(self, "favorites_entry_regex", _literal_regex(self.favorites_entry_text))
+        object.__setattr__(self, "cart_entry_regex", _literal_regex(self.cart_entry_text))
+        object.__setattr__(self, "saved_card_regex", _literal_regex(self.saved_card_text))
+
+
+@dataclass(frozen=True, slots=True)
+class BrowserSettings:
+    headless: bool
+    user_data_dir: Path
+    cdp_endpoint: str
+
+
+_SCHEMA: dict[str, tuple[str, bool, str]] = {
+    "base_url": ("BASE_URL", False, "https://www.loteriasonline.caixa.gov.br/silce-web/#/home"),
+    "headless": ("HEADLESS", False, "false"),
+    "slow_mo_ms": ("SLOW_MO_MS", False, "0"),
+    "timeout_ms": ("TIMEOUT_MS", False, "30000"),
+    "action_timeout_ms": ("ACTION_TIMEOUT_MS", False, "5000"),
+    "user_data_dir": ("USER_DATA_DIR", False, ".playwright-profile"),
+    "cdp_endpoint": ("CDP_ENDPOINT", False, ""),
+    "caixa_username": ("CAIXA_USERNAME", True, ""),
+    "caixa_password": ("CAIXA_PASSWORD", True, ""),
+    "favorite_item_name_exact": ("FAVORITE_ITEM_NAME_EXACT", True, ""),
+    "expected_total": ("EXPECTED_TOTAL", True, ""),
+    "card_holder_name": ("CARD_HOLDER_NAME", True, ""),
+    "card_number": ("CARD_NUMBER", True, ""),
+    "card_exp_month": ("CARD_EXP_MONTH", True, ""),
+    "card_exp_year": ("CARD_EXP_YEAR", True, ""),
+    "card_cvv": ("CARD_CVV", True, ""),
+    "use_saved_card": ("USE_SAVED_CARD", False, "true"),
+    "login_username_selector": ("LOGIN_USERNAME_SELECTOR", False, ""),
+    "login_next_selector": ("LOGIN_NEXT_SELECTOR", False, ""),
+    "login_next_text": ("LOGIN_NEXT_TEXT", False, "Próximo"),
+    "login_password_selector": ("LOGIN_PASSWORD_SELECTOR", False, ""),
+    "login_submit_selector": ("LOGIN_SUBMIT_SELECTOR", False, ""),
+    "login_otp_input_selector": ("LOGIN_OTP_INPUT_SELECTOR", False, ""),
+    "login_otp_submit_selector": ("LOGIN_OTP_SUBMIT_SELECTOR", False, ""),
+    "cookie_accept_selector": ("COOKIE_ACCEPT_SELECTOR", False, ""),
+    "cookie_accept_text": ("COOKIE_ACCEPT_TEXT", False, "Aceitar"),
+    "age_gate_prompt_text": ("AGE_GATE_PROMPT_TEXT", False, "Você tem mais de 18 anos?"),
+    "age_gate_confirm_selector": ("AGE_GATE_CONFIRM_SELECTOR", False, ""),
+    "age_gate_confirm_text": ("AGE_GATE_CONFIRM_TEXT", False, "Sim"),
+    "access_login_selector": ("ACCESS_LOGIN_SELECTOR", False, ""),
+    "access_login_text": ("ACCESS_LOGIN_TEXT", False, "Acessar"),
+    "enter_site_selector": ("ENTER_SITE_SELECTOR", False, ""),
+    "enter_site_text": ("ENTER_SITE_TEXT", False, ""),
+    "account_menu_selector": ("ACCOUNT_MENU_SELECTOR", False, ""),
+    "account_menu_text": ("ACCOUNT_MENU_TEXT", False, "Minha Conta"),
+    "favorites_entry_selector": ("FAVORITES_ENTRY_SELECTOR", False, ""),
+    "favorites_entry_text": ("FAVORITES_ENTRY_TEXT", False, "Carrinhos favoritos"),
+    "favorites_item_selector": ("FAVORITES_ITEM_SELECTOR", False, ""),
+    "favorites_add_button_selector": ("FAVORITES_ADD_BUTTON_SELECTOR", False, ""),
+    "favorites_add_button_text": ("FAVORITES_ADD_BUTTON_TEXT", False, "Adicionar"),
+    "cart_entry_selector": ("CART_ENTRY_SELECTOR", False, ""),
+    "cart_entry_text": ("CART_ENTRY_TEXT", False, "Carrinho"),
+    "checkout_button_selector": ("CHECKOUT_BUTTON_SELECTOR", False, ""),
+    "checkout_button_text": ("CHECKOUT_BUTTON_TEXT", False, "Finalizar"),
+    "total_selector": ("TOTAL_SELECTOR", False, ""),
+    "saved_card_selector": ("SAVED_CARD_SELECTOR", False, ""),
+    "saved_card_text": ("SAVED_CARD_TEXT", False, ""),
+    "saved_card_last4": ("SAVED_CARD_LAST4", False, ""),
+    "card_holder_selector": ("CARD_HOLDER_SELECTOR", False, ""),
+    "card_number_selector": ("CARD_NUMBER_SELECTOR", False, ""),
+    "card_exp_month_selector": ("CARD_EXP_MONTH_SELECTOR", False, ""),
+    "card_exp_year_selector": ("CARD_EXP_YEAR_SELECTOR", False, ""),
+    "card_cvv_selector": ("CARD_CVV_SELECTOR", False, ""),
+    "pay_submit_selector": ("PAY_SUBMIT_SELECTOR", False, ""),
+    "pay_submit_text": ("PAY_SUBMIT_TEXT", False, "Pagar"),
+    "payment_otp_input_selector": ("PAYMENT_OTP_INPUT_SELECTOR", False, ""),
+    "payment_otp_submit_selector": ("PAYMENT_OTP_SUBMIT_SELECTOR", False, ""),
+    "success_text": ("SUCCESS_TEXT", False, "Pagamento realizado"),
+    "failure_text": ("FAILURE_TEXT", False, "Pagamento recusado"),
+    "capture_snapshots_on_error": ("CAPTURE_SNAPSHOTS_ON_ERROR", False, "true"),
+}
+
+_CONVERTERS: dict[str, Callable[[str], Any]] = {
+    "headless": _as_bool,
+    "slow_mo_ms": int,
+    "timeout_ms": int,
+    "action_timeout_ms": int,
+    "user_data_dir": Path,
+    "use_saved_card": _as_bool,
+    "capture_snapshots_on_error": _as_bool,
+}
+
+
+def load_config(env_file: Path | None = None) -> AppConfig:
+    return AppConfig(**_resolve(_read_env(env_file), tuple(_SCHEMA)))
+
+
+def load_browser_settings(env_file: Path | None = None) -> BrowserSettings:
+    # The warm-browser daemon only needs these, so it starts without the account and card variables set.
+    return BrowserSettings(**_resolve(_read_env(env_file), ("headless", "user_data_dir", "cdp_endpoint")))
+
+
+def _read_env(env_file: Path | None) -> Mapping[str, str]:
+    if env_file is None:
+        load_dotenv(override=False)
+        return os.environ
+    # Explicit env files are merged without touching os.environ so several accounts can load side by side.
+    file_values = {key: value for key, value in dotenv_values(env_file).items() if value is not None}
+    return {**file_values, **os.environ}
+
+
+def _resolve(env: Mapping[str, str], attrs: tuple[str, ...]) -> dict[str, Any]:
+    resolved: dict[str, Any] = {}
+    for attr in attrs:
+        var, required, default = _SCHEMA[attr]
+        resolved[attr] = env.get(var, default).strip()
+        if required and not resolved[attr]:
+            raise ValueError(f"Missing required env var: {var}")
+    for attr, convert in _CONVERTERS.items():
+        if attr in resolved:
+            resolved[attr] = convert(resolved[attr])
+    return resolved
@@ -1,33 +1,26 @@
 from __future__ import annotations
 
+import logging
 import sys
-from datetime import datetime
+import threading
+import time
 from pathlib import Path
 
-from .browser import close_browser, start_browser
-from .config import load_config
+from .config import AppConfig, load_config
 from .errors import AutomationError
-from .steps.checkout import run_checkout_and_payment
-from .steps.favorites import run_favorites_flow
-from .steps.login import run_login
-from .utils.logging_utils import build_logger, mask_card
-from .utils.snapshots import save_snapshot
+from .utils.logging_utils import build_logger
 
 
-def main() -> int:
-    run_id = datetime.now().strftime("%Y%m%d_%H%M%S")
-    run_dir = Path("runs") / run_id
-    logger = build_logger(run_dir / "run.log")
-
-    try:
-        config = load_config()
-    except Exception as exc:
-        print(f"Config error: {exc}")
-        return 2
+def run_flow(config: AppConfig, logger: logging.Logger, run_dir: Path) -> int:
+    # Playwright and the step modules are imported only once a valid config exists.
+    from .browser import close_browser, start_browser
+    from .steps.checkout import run_checkout_and_payment
+    from .steps.favorites import run_favorites_flow
+    from .steps.login import run_login
+    from .utils.snapshots import save_snapshot
 
-    logger.info("Starting automation run_id=%s", run_id)
     logger.info("Headless=%s BaseURL=%s", config.headless, config.base_url)
-    logger.info("Card ending with %s", mask_card(config.card_number))
+    logger.info("Card ending with %s", config.card_number_masked)
 
     playwright = None
     context = None
@@ -44,8 +37,8 @@ def main() -> int:
         return 0
     except AutomationError as exc:
         logger.error("Automation failed: %s", exc)
-        if page is not None:
-            shot = save_snapshot(page, run_dir, "fatal_error")
+        if config.capture_snapshots_on_error and page is not None:
+            shot = save_snapshot(page, run_dir, "fatal_error", full=True, fmt="png")
             if shot is not None:
                 logger.error("Fatal screenshot: %s", shot)
             else:
@@ -56,8 +49,8 @@ def main() -> int:
         return 1
     except Exception as exc:
         logger.exception("Unexpected failure: %s", exc)
-        if page is not None:
-            shot = save_snapshot(page, run_dir, "unexpected_error")
+        if config.capture_snapshots_on_error and page is not None:
+            shot = save_snapshot(page, run_dir, "unexpected_error", full=True, fmt="png")
             if shot is not None:
                 logger.error("Unexpected screenshot: %s", shot)
             else:
@@ -71,5 +64,66 @@ def main() -> int:
             close_browser(playwright, context)
 
 
+def orchestrate(configs: dict[str, AppConfig], run_dir: Path) -> int:
+    results: dict[str, int] = {}
+
+    def worker(label: str, config: AppConfig) -> None:
+        account_dir = run_dir / label
+        logger = build_logger(account_dir / "run.log", tag=label)
+        results[label] = run_flow(config, logger, account_dir)
+
+    threads = [
+        threading.Thread(target=worker, args=(label, config), name=label) for label, config in configs.items()
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for label in configs:
+        print(f"{label}: {'SUCCESS' if results.get(label) == 0 else 'FAILED'}")
+    return max((results.get(label, 1) for label in configs), default=0)
+
+
+def main(argv: list[str] | None = None) -> int:
+    env_files = [Path(arg) for arg in (sys.argv[1:] if argv is None else argv)]
+    run_id = time.strftime("%Y%m%d_%H%M%S")
+    run_dir = Path("runs") / run_id
+
+    try:
+        for env_file in env_files:
+            if not env_file.is_file():
+                raise ValueError(f"Env file not found: {env_file}")
+        if len(env_files) <= 1:
+            configs = {"default": load_config(env_files[0] if env_files else None)}
+        else:
+            resolved = [env_file.resolve() for env_file in env_files]
+            if len(set(resolved)) != len(resolved):
+                raise ValueError("Each env file may be passed only once")
+            # The file name labels the account's prompts and artifacts; same-named files in different folders get
+            # their position prepended so neither account is dropped.
+            names = [env_file.name for env_file in env_files]
+            labels = [name if names.count(name) == 1 else f"{index}-{name}" for index, name in enumerate(names, 1)]
+            configs = {label: load_config(env_file) for label, env_file in zip(labels, env_files)}
+            profiles = [config.user_data_dir.resolve() for config in configs.values()]
+            if len(set(profiles)) != len(profiles):
+                raise ValueError("Each env file must set a distinct USER_DATA_DIR to run in parallel")
+            # A CDP-attached run drives the browser's first context and page, so two accounts would share them.
+            endpoints = [config.cdp_endpoint for config in configs.values() if config.cdp_endpoint]
+            if len(set(endpoints)) != len(endpoints):
+                raise ValueError("Each env file must set a distinct CDP_ENDPOINT (or none) to run in parallel")
+    except Exception as exc:
+        print(f"Config error: {exc}")
+        return 2
+
+    if len(configs) > 1:
+        print(f"Starting {len(configs)} accounts in parallel run_id={run_id}")
+        return orchestrate(configs, run_dir)
+
+    logger = build_logger(run_dir / "run.log")
+    logger.info("Starting automation run_id=%s", run_id)
+    return run_flow(configs["default"], logger, run_dir)
+
+
 if __name__ == "__main__":
     raise SystemExit(main())
@@ -2,23 +2,273 @@ from __future__ import annotations
 
 import logging
 import re
+import time
+from functools import lru_cache
 from pathlib import Path
+from typing import Any, Callable
+from weakref import WeakSet
 
 from playwright.sync_api import Error as PlaywrightError
-from playwright.sync_api import Locator, Page, TimeoutError as PlaywrightTimeoutError
+from playwright.sync_api import Locator, Page, TimeoutError as PlaywrightTimeoutError, expect
 
 from ..config import AppConfig
 from ..errors import AutomationError
-from ..utils.snapshots import save_snapshot
+from ..utils.prompt import cancel_prompt, prompt_code_async
+from ..utils.snapshots import flush_snapshots, save_snapshot_async
 from ..utils.ui import (
-    any_visible_by_selectors,
+    cached_locator,
     click_by_text,
     fill_first_available,
+    find_visible_locator_by_selectors,
+    first_locator,
+    first_visible_of,
     normalize_money,
     text_exists,
     visible_locator_by_selectors,
 )
 
+_CART_REGEX = re.compile(r"\bcarrinho\b(?!s?\s+favorit)|\bcart\b", re.IGNORECASE)
+_PAYMENT_CTA_REGEX = re.compile(r"ir\s+pra\s+pagamento", re.IGNORECASE)
+_CHECKOUT_REGEX = re.compile(r"finalizar|checkout|pagamento|fechar pedido", re.IGNORECASE)
+_SUBMIT_REGEX = re.compile(r"continuar|pagar|concluir|finalizar|confirmar", re.IGNORECASE)
+_SAVED_CARD_PATTERN = re.compile(r"\*{2,}\s*\d{4}")
+# Success and processing markers can render in the page body once the modal closes, so they match anywhere visible.
+_PROGRESS_REGEX = re.compile(
+    r"\b(?:processando|aguarde|analisando|confirmando|pagamento realizado|sucesso|comprovante)\b", re.IGNORECASE
+)
+_FAILURE_REGEX = re.compile(r"\b(?:pagamento recusado|falhas?|erros?)\b", re.IGNORECASE)
+# Error words only count inside these; the rest of the page carries static words like "erro" in help text.
+_FEEDBACK_CONTAINER_SELECTORS = (
+    "[role='dialog']",
+    "[role='alert']",
+    "[role='status']",
+    ".modal",
+    ".ui-dialog",
+    ".swal2-popup",
+    ".alert",
+    ".toast",
+)
+_FEEDBACK_ARG = [_PROGRESS_REGEX.pattern, _FAILURE_REGEX.pattern, list(_FEEDBACK_CONTAINER_SELECTORS)]
+_CONFIRM_REGEX = re.compile(
+    r"confirmar|confirmo|continuar|enviar|validar|pagar|concluir|prosseguir|finalizar|ok",
+    re.IGNORECASE,
+)
+_DISMISS_REGEX = re.compile(
+    r"\b(fechar|cancelar|voltar|corrigir|nao|n\u00e3o|close|dismiss|btn-close|modal-close)\b|(^|\s)x(\s|$)",
+    re.IGNORECASE,
+)
+_CONFIRMAR_REGEX = re.compile(r"confirmar", re.IGNORECASE)
+_CHECKOUT_CONFIRM_REGEX = re.compile(r"\b(?:confirmar|confirmo|sim)\b", re.IGNORECASE)
+_CLICKABLE_SELECTOR = "button, a, [role='button'], input[type='button'], input[type='submit']"
+_PAYMENT_SUCCESS_REGEX = re.compile(r"pagamento realizado|aposta(s)? realizada(s)?|sucesso|comprovante", re.IGNORECASE)
+_PAYMENT_FAILURE_REGEX = re.compile(r"pagamento recusado|n[oã]o autorizado|falha|erro|negado", re.IGNORECASE)
+_CREDIT_CARD_REGEX = re.compile(r"cart[aã]o de cr[eé]dito", re.IGNORECASE)
+_OTP_SUBMIT_TEXT_REGEX = re.compile(r"confirmar|continuar|enviar|validar", re.IGNORECASE)
+
+_HEADER_CART_BADGE_ATTRIBUTE = "data-loterias-cart-badge"
+_HEADER_CART_SELECTORS = (
+    "xpath=//nav[@id='menuPrincipal']//*[self::a or self::button][contains(normalize-space(.), 'Minha Conta')]/preceding-sibling::*[self::a or self::button][1]",
+    f"[{_HEADER_CART_BADGE_ATTRIBUTE}]",
+    "xpath=//nav[@id='menuPrincipal']//*[self::a or self::button][.//i[contains(@class,'shopping-cart')] or .//*[contains(@class,'shopping-cart')]]",
+    "xpath=//nav[@id='menuPrincipal']//*[self::a or self::button][contains(@href,'carrinho') or contains(@href,'cart')]",
+)
+_CART_ENTRY_SELECTORS = (
+    "nav .navbar-right a:has(.fa-shopping-cart)",
+    "nav .navbar-right button:has(.fa-shopping-cart)",
+    "nav .navbar-right a:has(i.fa-shopping-cart)",
+    "nav .navbar-right button:has(i.fa-shopping-cart)",
+    "a:has(.fa-shopping-cart)",
+    "button:has(.fa-shopping-cart)",
+    "a:has(i.fa-shopping-cart)",
+    "button:has(i.fa-shopping-cart)",
+    "a[href*='carrinho' i]",
+    "a[href*='cart' i]",
+    "[data-testid*='cart' i]",
+    "[class*='cart' i] a",
+)
+_PAYMENT_SUBMIT_SELECTORS = (
+    "button:has-text('Continuar')",
+    "a:has-text('Continuar')",
+    "button:has-text('Pagar')",
+    "button:has-text('Concluir')",
+    "button:has-text('Finalizar')",
+    "a:has-text('Pagar')",
+)
+_STATIC_CHECKOUT_TEXTS = ("Ir pra pagamento", "Finalizar", "Pagamento", "Fechar pedido")
+_MODAL_SELECTORS = (".modal", ".modal-dialog", ".ui-dialog", ".swal2-popup")
+_CONFIRMATION_MODAL_SELECTORS = ("[role='dialog']", *_MODAL_SELECTORS)
+_STRICT_OTP_MODAL_SELECTOR = "#confirm-cancel-cvv"
+
+_CART_PAGE_MARKERS = ("Carrinho de Apostas", "Apostas Individuais", "Ir pra pagamento")
+_FAVORITES_MARKER = "Carrinhos Favoritos"
+_HOME_PRODUCTS_MARKER = "Todos os produtos"
+
+_CART_ROUTE_HASHES = ("#/carrinho", "#/cart", "#/checkout")
+_SET_LOCATION_HASH_JS = """(hash) => { window.location.hash = hash; }"""
+_CART_ROUTE_READY_JS = """() => {
+    const text = (document.body ? document.body.innerText : "").toLowerCase();
+    return !text.includes("carrinhos favoritos") && (text.includes("finalizar") || text.includes("pagamento"));
+}"""
+
+_ELEMENT_METADATA_ATTRIBUTES = [
+    "value",
+    "aria-label",
+    "title",
+    "id",
+    "class",
+    "name",
+    "data-dismiss",
+    "data-bs-dismiss",
+    "data-action",
+    "onclick",
+    "type",
+]
+_ELEMENT_METADATA_JS = """(el, attributes) => {
+    const metadata = { text: el.innerText || "" };
+    for (const name of attributes) {
+        metadata[name] = el.getAttribute(name) || "";
+    }
+    return metadata;
+}"""
+
+# Marks the cart badge next to "Minha Conta" (a control with a cart icon or a digit) so it can be clicked
+# through a plain attribute selector, then reports which header candidates exist.
+_HEADER_CART_PROBE_JS = """([selectors, badgeAttribute]) => {
+    document.querySelectorAll(`[${badgeAttribute}]`).forEach((el) => el.removeAttribute(badgeAttribute));
+    const nav = document.querySelector("nav#menuPrincipal");
+    const controls = nav ? Array.from(nav.querySelectorAll("a, button")) : [];
+    const account = controls.find((el) => (el.textContent || "").includes("Minha Conta"));
+    const container = account && account.parentElement ? account.parentElement.closest("div, li") : null;
+    const badge = container
+        ? Array.from(container.querySelectorAll("a, button")).find(
+            (el) => el.querySelector("[class*='shopping-cart']") || /\d/.test(el.textContent || "")
+        )
+        : null;
+    if (badge) {
+        badge.setAttribute(badgeAttribute, "");
+    }
+    return selectors.map((selector) => {
+        try {
+            if (selector.startsWith("xpath=")) {
+                const xpath = selector.slice("xpath=".length);
+                return !!document.evaluate(xpath, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null)
+                    .singleNodeValue;
+            }
+            return !!document.querySelector(selector);
+        } catch (error) {
+            return true;
+        }
+    });
+}"""
+_PAGE_MARKERS_JS = """(keywords) => {
+    const text = (document.body ? document.body.innerText : "").toLowerCase();
+    const found = keywords.filter((keyword) => text.includes(keyword.toLowerCase()));
+    return found.length ? found : null;
+}"""
+_OTP_MODAL_INPUT_SELECTORS = [
+    "input[data-checkout='securityCodeModal']",
+    "input[name='otp']",
+    "input[name*='codigo']",
+    "input[id*='codigo']",
+    "input[placeholder*='C\u00f3digo']",
+    "input[placeholder*='codigo']",
+]
+_OTP_MODAL_FLAGS_JS = """(el, inputSelectors) => {
+    const isVisible = (node) => !!(node.offsetWidth || node.offsetHeight || node.getClientRects().length);
+    const visible = (selector) => Array.from(el.querySelectorAll(selector)).some(isVisible);
+    const confirmButton = Array.from(el.querySelectorAll("button")).some(
+        (button) => isVisible(button) && /confirmar/i.test(button.innerText || "")
+    );
+    return {
+        text: /c[o\u00f3]digo de seguran|confirma o pagamento/i.test(el.innerText || ""),
+        otp: inputSelectors.some(visible),
+        confirm: visible("#confirmarModalConfirmacao") || confirmButton,
+    };
+}"""
+_FEEDBACK_JS = """([progressPattern, failurePattern, selectors]) => {
+    if (new RegExp(progressPattern, "i").test(document.body ? document.body.innerText : "")) {
+        return true;
+    }
+    const failure = new RegExp(failurePattern, "i");
+    const isVisible = (el) => !!(el.offsetWidth || el.offsetHeight || el.getClientRects().length);
+    return Array.from(document.querySelectorAll(selectors.join(", "))).some(
+        (el) => isVisible(el) && failure.test(el.innerText || "")
+    );
+}"""
+# innerText forces a layout pass, so page text is only read when no modal is visible.
+_CONFIRMATION_STATE_JS = """(modalSelectors) => {
+    const isVisible = (el) => !!(el.offsetWidth || el.offsetHeight || el.getClientRects().length);
+    if (modalSelectors.some((selector) => Array.from(document.querySelectorAll(selector)).some(isVisible))) {
+        return { modal: true, confirma: null, total: null };
+    }
+    const text = (document.body ? document.body.innerText : "").toLowerCase();
+    return { modal: false, confirma: text.includes("confirma"), total: text.includes("valor total") };
+}"""
+_CONFIRMATION_MODAL_CLOSED_JS = f"""(modalSelectors) => {{
+    const state = ({_CONFIRMATION_STATE_JS})(modalSelectors);
+    return !state.modal && !state.confirma;
+}}"""
+# Mirrors Locator.fill: native value setter plus input/change events so framework bindings see the value.
+_BULK_FILL_JS = """(fields) => {
+    const isVisible = (el) => !!(el.offsetWidth || el.offsetHeight || el.getClientRects().length);
+    const setValue = Object.getOwnPropertyDescriptor(HTMLInputElement.prototype, "value").set;
+    const unfilled = [];
+    for (const [name, value, selectors] of fields) {
+        let target = null;
+        for (const selector of selectors) {
+            if (!selector || !selector.trim()) continue;
+            try {
+                target = Array.from(document.querySelectorAll(selector)).find(isVisible) || null;
+            } catch (error) {
+                target = null;
+            }
+            if (target) break;
+        }
+        if (!target || !(target instanceof HTMLInputElement) || target.disabled || target.readOnly) {
+            unfilled.push(name);
+            continue;
+        }
+        target.focus();
+        setValue.call(target, value);
+        target.dispatchEvent(new Event("input", { bubbles: true }));
+        target.dispatchEvent(new Event("change", { bubbles: true }));
+    }
+    return unfilled;
+}"""
+_TEXT_PRESENT_JS = """(labels) => {
+    const text = (document.body ? document.body.innerText : "").toLowerCase();
+    return labels.some((label) => text.includes(label.toLowerCase()));
+}"""
+_CHECKOUT_STATE_JS = """([keywords, fieldSelectors, modalSelectors]) => {
+    const text = (document.body ? document.body.innerText : "").toLowerCase();
+    const isVisible = (el) => !!(el.offsetWidth || el.offsetHeight || el.getClientRects().length);
+    const anyVisible = (selectors) => selectors.some((selector) => {
+        try {
+            return Array.from(document.querySelectorAll(selector)).some(isVisible);
+        } catch (error) {
+            return false;
+        }
+    });
+    const state = {
+        url: location.href,
+        markers: keywords.filter((keyword) => text.includes(keyword.toLowerCase())),
+        modal: anyVisible(modalSelectors),
+        fields: anyVisible(fieldSelectors),
+    };
+    // Null keeps wait_for_function polling until some signal the decision can act on shows up.
+    const decisive = /pagamento/i.test(state.url) || state.markers.length || state.fields;
+    return decisive ? state : null;
+}"""
+
+# Filled by each page's "close" event so polling loops can check closure without calling into Playwright.
+_PAGE_CLOSED: WeakSet[Page] = WeakSet()
+_CLOSE_TRACKED: WeakSet[Page] = WeakSet()
+
+
+@lru_cache(maxsize=32)
+def _last4_regex(digits: str) -> re.Pattern[str]:
+    return re.compile(rf"(?:\*{{2,}}\s*)?{re.escape(digits)}\b")
+
 
 def _try_click(locator, timeout_ms: int = 2200) -> bool:
     try:
@@ -30,10 +280,18 @@ def _try_click(locator, timeout_ms: int = 2200) -> bool:
 
 
 def _page_is_closed(page: Page) -> bool:
+    if page in _PAGE_CLOSED:
+        return True
+    if page in _CLOSE_TRACKED:
+        return False
+    _CLOSE_TRACKED.add(page)
     try:
-        return page.is_closed()
+        page.on("close", _PAGE_CLOSED.add)
+        if page.is_closed():
+            _PAGE_CLOSED.add(page)
     except PlaywrightError:
-        return True
+        _PAGE_CLOSED.add(page)
+    return page in _PAGE_CLOSED
 
 
 def _cart_context_changed(page: Page, before_url: str) -> bool:
@@ -54,43 +312,23 @@ def _cart_context_changed(page: Page, before_url: str) -> bool:
     )
 
 
-def _is_cart_page(page: Page) -> bool:
-    return (
-        text_exists(page, "Carrinho de Apostas", exact=False, timeout_ms=900)
-        or text_exists(page, "Apostas Individuais", exact=False, timeout_ms=900)
-        or text_exists(page, "Ir pra pagamento", exact=False, timeout_ms=900)
-    )
-
-
-def _is_favorites_page(page: Page) -> bool:
-    return text_exists(page, "Carrinhos Favoritos", exact=False, timeout_ms=700)
-
-
-def _is_home_products_page(page: Page) -> bool:
-    return text_exists(page, "Todos os produtos", exact=False, timeout_ms=700)
-
-
-def _is_checkout_or_payment_page(page: Page, config: AppConfig) -> bool:
+def _wait_for_state(page: Page, script: str, arg: Any, timeout_ms: int) -> Any:
     try:
-        current_url = page.url or ""
-    except PlaywrightError:
-        current_url = ""
+        return page.wait_for_function(script, arg=arg, timeout=timeout_ms).json_value()
+    except (PlaywrightTimeoutError, PlaywrightError):
+        return None
 
-    if "pagamento" in current_url.lower() or "#/carrinho/pagamento" in current_url.lower():
-        return True
 
-    if text_exists(page, "Forma de Pagamento", exact=False, timeout_ms=700):
-        return True
+def _page_markers(page: Page, keywords: tuple[str, ...], timeout_ms: int = 900) -> set[str]:
+    return set(_wait_for_state(page, _PAGE_MARKERS_JS, list(keywords), timeout_ms) or ())
 
-    if _is_confirmation_modal_visible(page) and text_exists(page, "Confirma", exact=False, timeout_ms=700):
-        return True
 
-    if _is_home_products_page(page) or _is_favorites_page(page) or _is_cart_page(page):
-        return False
+def _is_cart_page(page: Page) -> bool:
+    return bool(_page_markers(page, _CART_PAGE_MARKERS))
 
-    if text_exists(page, config.pay_submit_text or "Pagar", exact=False, timeout_ms=700):
-        return True
 
+def _is_checkout_or_payment_page(page: Page, config: AppConfig) -> bool:
+    pay_text = config.pay_submit_text or "Pagar"
     payment_fields = [
         config.card_number_selector,
         config.card_holder_selector,
@@ -102,18 +340,56 @@ def _is_checkout_or_payment_page(page: Page, config: AppConfig) -> bool:
         "input[name='cvv']",
         "input[autocomplete='cc-csc']",
     ]
-    return any_visible_by_selectors(page, payment_fields, timeout_ms=700)
+    state_arg = [
+        ["Forma de Pagamento", "Confirma", pay_text, _HOME_PRODUCTS_MARKER, _FAVORITES_MARKER, *_CART_PAGE_MARKERS],
+        [selector for selector in payment_fields if selector and selector.strip()],
+        ["[role='dialog']", *_MODAL_SELECTORS],
+    ]
+    state = _wait_for_state(page, _CHECKOUT_STATE_JS, state_arg, 700)
+    if not state:
+        return False
+
+    current_url = (state["url"] or "").lower()
+    markers = set(state["markers"])
+
+    if "pagamento" in current_url:
+        return True
+
+    if "Forma de Pagamento" in markers:
+        return True
+
+    if state["modal"] and "Confirma" in markers:
+        return True
 
+    if markers & {_HOME_PRODUCTS_MARKER, _FAVORITES_MARKER, *_CART_PAGE_MARKERS}:
+        return False
+
+    if pay_text in markers:
+        return True
+
+    return bool(state["fields"])
 
-def _header_cart_click_candidates(page: Page):
+
+def _header_cart_click_candidates(page: Page) -> list[Locator]:
+    try:
+        existing = page.evaluate(_HEADER_CART_PROBE_JS, [list(_HEADER_CART_SELECTORS), _HEADER_CART_BADGE_ATTRIBUTE])
+    except PlaywrightError:
+        existing = [True] * len(_HEADER_CART_SELECTORS)
     return [
-        page.locator("xpath=//nav[@id='menuPrincipal']//*[self::a or self::button][contains(normalize-space(.), 'Minha Conta')]/preceding-sibling::*[self::a or self::button][1]").first,
-        page.locator("xpath=//nav[@id='menuPrincipal']//*[self::a or self::button][contains(normalize-space(.), 'Minha Conta')]/ancestor::*[self::div or self::li][1]//*[self::a or self::button][.//*[contains(@class,'shopping-cart')] or contains(normalize-space(.),'0') or contains(normalize-space(.),'1') or contains(normalize-space(.),'2') or contains(normalize-space(.),'3') or contains(normalize-space(.),'4') or contains(normalize-space(.),'5') or contains(normalize-space(.),'6') or contains(normalize-space(.),'7') or contains(normalize-space(.),'8') or contains(normalize-space(.),'9')][1]").first,
-        page.locator("xpath=//nav[@id='menuPrincipal']//*[self::a or self::button][.//i[contains(@class,'shopping-cart')] or .//*[contains(@class,'shopping-cart')]]").first,
-        page.locator("xpath=//nav[@id='menuPrincipal']//*[self::a or self::button][contains(@href,'carrinho') or contains(@href,'cart')]").first,
+        first_locator(page, selector)
+        for selector, exists in zip(_HEADER_CART_SELECTORS, existing)
+        if exists
     ]
 
 
+def _cart_route_loaded(page: Page, timeout_ms: int = 1500) -> bool:
+    try:
+        page.wait_for_function(_CART_ROUTE_READY_JS, timeout=timeout_ms)
+        return True
+    except (PlaywrightTimeoutError, PlaywrightError):
+        return False
+
+
 def _navigate_cart_routes(page: Page, logger: logging.Logger) -> bool:
     try:
         current = page.url or ""
@@ -123,25 +399,19 @@ def _navigate_cart_routes(page: Page, logger: logging.Logger) -> bool:
     if not current:
         return False
 
-    base = current.split("#", 1)[0]
-    route_candidates = [
-        f"{base}#/carrinho",
-        f"{base}#/cart",
-        f"{base}#/checkout",
-    ]
-
-    for target in route_candidates:
+    base, _, _ = current.partition("#")
+    for route in _CART_ROUTE_HASHES:
+        # Hash routes are handled by the SPA router, so there is no document load to wait for.
         try:
-            page.goto(target, wait_until="domcontentloaded", timeout=15000)
+            page.evaluate(_SET_LOCATION_HASH_JS, route)
         except PlaywrightError:
-            continue
+            try:
+                page.goto(base + route, wait_until="commit", timeout=15000)
+            except PlaywrightError:
+                continue
 
-        if text_exists(page, "Carrinhos Favoritos", exact=False, timeout_ms=700):
-            continue
-        if text_exists(page, "Finalizar", exact=False, timeout_ms=1200) or text_exists(
-            page, "Pagamento", exact=False, timeout_ms=1200
-        ):
-            logger.info("Opened cart/checkout by direct route: %s", target)
+        if _cart_route_loaded(page):
+            logger.info("Opened cart/checkout by direct route: %s%s", base, route)
             return True
 
     return False
@@ -161,35 +431,20 @@ def _open_cart(page: Page, config: AppConfig, logger: logging.Logger) -> bool:
                 return True
 
     for candidate in _header_cart_click_candidates(page):
-        if _try_click(candidate):
+        if _try_click(candidate, timeout_ms=800):
             page.wait_for_timeout(600)
             if _is_cart_page(page) or _cart_context_changed(page, before_url):
                 logger.info("Opened cart using header cart control")
                 return True
 
     for candidate in _header_cart_click_candidates(page):
-        if _try_click(candidate):
+        if _try_click(candidate, timeout_ms=800):
             page.wait_for_timeout(900)
             if _is_cart_page(page):
                 logger.info("Opened cart using header cart control (retry)")
                 return True
 
-    cart_regex = re.compile(r"\bcarrinho\b(?!s?\s+favorit)|\bcart\b", re.IGNORECASE)
-    cart_selectors = [
-        "nav .navbar-right a:has(.fa-shopping-cart)",
-        "nav .navbar-right button:has(.fa-shopping-cart)",
-        "nav .navbar-right a:has(i.fa-shopping-cart)",
-        "nav .navbar-right button:has(i.fa-shopping-cart)",
-        "a:has(.fa-shopping-cart)",
-        "button:has(.fa-shopping-cart)",
-        "a:has(i.fa-shopping-cart)",
-        "button:has(i.fa-shopping-cart)",
-        "a[href*='carrinho' i]",
-        "a[href*='cart' i]",
-        "[data-testid*='cart' i]",
-        "[class*='cart' i] a",
-    ]
-    for selector in cart_selectors:
+    for selector in _CART_ENTRY_SELECTORS:
         if _try_click(page.locator(selector).first):
             page.wait_for_timeout(500)
             if _is_cart_page(page) or _cart_context_changed(page, before_url):
@@ -197,8 +452,8 @@ def _open_cart(page: Page, config: AppConfig, logger: logging.Logger) -> bool:
                 return True
 
     for candidate in [
-        page.get_by_role("link", name=cart_regex).first,
-        page.get_by_role("button", name=cart_regex).first,
+        page.get_by_role("link", name=_CART_REGEX).first,
+        page.get_by_role("button", name=_CART_REGEX).first,
     ]:
         if _try_click(candidate):
             page.wait_for_timeout(500)
@@ -207,7 +462,7 @@ def _open_cart(page: Page, config: AppConfig, logger: logging.Logger) -> bool:
                 return True
 
     if config.cart_entry_text and config.cart_entry_text.strip():
-        text_regex = re.compile(re.escape(config.cart_entry_text), re.IGNORECASE)
+        text_regex = config.cart_entry_regex
         for candidate in [
             page.get_by_role("link", name=text_regex).first,
             page.get_by_role("button", name=text_regex).first,
@@ -232,6 +487,20 @@ def _click_checkout(page: Page, config: AppConfig, logger: logging.Logger) -> bo
     except PlaywrightError:
         pass
 
+    if _click_checkout_candidates(page, config, logger):
+        return True
+
+    try:
+        current_url = page.url or ""
+    except PlaywrightError:
+        current_url = ""
+    if before_url and current_url and current_url != before_url:
+        logger.info("Checkout click changed URL but payment context not detected: %s", current_url)
+
+    return False
+
+
+def _click_checkout_candidates(page: Page, config: AppConfig, logger: logging.Logger) -> bool:
     if config.checkout_button_selector and config.checkout_button_selector.strip():
         if _try_click(page.locator(config.checkout_button_selector).first, timeout_ms=2500):
             page.wait_for_timeout(700)
@@ -240,8 +509,8 @@ def _click_checkout(page: Page, config: AppConfig, logger: logging.Logger) -> bo
                 return True
 
     explicit_candidates = [
-        page.get_by_role("button", name=re.compile(r"ir\s+pra\s+pagamento", re.IGNORECASE)).first,
-        page.get_by_role("link", name=re.compile(r"ir\s+pra\s+pagamento", re.IGNORECASE)).first,
+        page.get_by_role("button", name=_PAYMENT_CTA_REGEX).first,
+        page.get_by_role("link", name=_PAYMENT_CTA_REGEX).first,
         page.locator("button:has-text('Ir pra pagamento')").first,
         page.locator("a:has-text('Ir pra pagamento')").first,
     ]
@@ -253,10 +522,9 @@ def _click_checkout(page: Page, config: AppConfig, logger: logging.Logger) -> bo
                 logger.info("Opened checkout by explicit payment CTA")
                 return True
 
-    checkout_regex = re.compile(r"finalizar|checkout|pagamento|fechar pedido", re.IGNORECASE)
     for candidate in [
-        page.get_by_role("button", name=checkout_regex).first,
-        page.get_by_role("link", name=checkout_regex).first,
+        page.get_by_role("button", name=_CHECKOUT_REGEX).first,
+        page.get_by_role("link", name=_CHECKOUT_REGEX).first,
     ]:
         if _try_click(candidate, timeout_ms=2500):
             page.wait_for_timeout(700)
@@ -265,32 +533,20 @@ def _click_checkout(page: Page, config: AppConfig, logger: logging.Logger) -> bo
                 logger.info("Opened checkout by role regex")
                 return True
 
-    texts = [config.checkout_button_text, "Ir pra pagamento", "Finalizar", "Pagamento", "Fechar pedido"]
-    seen: set[str] = set()
-    for text in texts:
-        key = (text or "").strip()
-        if not key or key in seen:
+    configured_text = (config.checkout_button_text or "").strip()
+    static_texts = tuple(text for text in _STATIC_CHECKOUT_TEXTS if text != configured_text)
+    # The configured label gets its own attempt first: .first over a union picks by DOM order, not label order.
+    for texts in ((configured_text,) if configured_text else (), static_texts):
+        if not texts:
             continue
-        seen.add(key)
-        if _try_click(page.locator(f"button:has-text('{key}')").first, timeout_ms=2000):
+        # One wait per group; :visible keeps .first off hidden menu entries that share a label.
+        union = ", ".join(f"button:has-text('{key}'):visible, a:has-text('{key}'):visible" for key in texts)
+        if _try_click(first_locator(page, union), timeout_ms=2500):
             page.wait_for_timeout(700)
             _handle_checkout_confirmation_modal(page, logger)
             if _is_checkout_or_payment_page(page, config):
-                logger.info("Opened checkout by button text: %s", key)
+                logger.info("Opened checkout by button/link text: %s", ", ".join(texts))
                 return True
-        if _try_click(page.locator(f"a:has-text('{key}')").first, timeout_ms=2000):
-            page.wait_for_timeout(700)
-            _handle_checkout_confirmation_modal(page, logger)
-            if _is_checkout_or_payment_page(page, config):
-                logger.info("Opened checkout by link text: %s", key)
-                return True
-
-    try:
-        current_url = page.url or ""
-    except PlaywrightError:
-        current_url = ""
-    if before_url and current_url and current_url != before_url:
-        logger.info("Checkout click changed URL but payment context not detected: %s", current_url)
 
     return False
 
@@ -304,26 +560,44 @@ def _payment_submit_visible(page: Page, config: AppConfig) -> bool:
     return False
 
 
-def _wait_for_payment_submit(page: Page, config: AppConfig, timeout_ms: int = 8000) -> bool:
-    polls = max(1, timeout_ms // 250)
-    for _ in range(polls):
-        if _payment_submit_visible(page, config):
+def _poll_with_backoff(page: Page, probe: Callable[[], bool], timeout_ms: int, max_delay_ms: int = 250) -> bool:
+    deadline = time.monotonic() + timeout_ms / 1000
+    delay_ms = 25
+    while time.monotonic() < deadline:
+        if probe():
             return True
-        page.wait_for_timeout(250)
+        page.wait_for_timeout(delay_ms)
+        delay_ms = min(int(delay_ms * 1.6), max_delay_ms)
     return False
 
 
+def _wait_for_payment_submit(page: Page, config: AppConfig, timeout_ms: int = 8000) -> bool:
+    labels = [config.pay_submit_text, "Continuar", "Pagar", "Concluir", "Finalizar", "Confirmar"]
+    deadline = time.monotonic() + timeout_ms / 1000
+    try:
+        page.wait_for_function(
+            _TEXT_PRESENT_JS, arg=[label.strip() for label in labels if label and label.strip()], timeout=timeout_ms
+        )
+        return True
+    except PlaywrightTimeoutError:
+        return False
+    except PlaywrightError:
+        # Navigation destroyed the evaluation context; fall back to polling for the remaining budget.
+        remaining_ms = max(1, int((deadline - time.monotonic()) * 1000))
+        return _poll_with_backoff(page, lambda: _payment_submit_visible(page, config), remaining_ms)
+
+
 def _click_saved_card_text(page: Page, logger: logging.Logger, last4: str | None = None) -> bool:
     if last4:
         digits = "".join(ch for ch in last4 if ch.isdigit())[-4:]
         if len(digits) == 4:
-            specific = page.get_by_text(re.compile(rf"(?:\*{{2,}}\s*)?{re.escape(digits)}\b")).first
+            specific = page.get_by_text(_last4_regex(digits)).first
             if _try_click(specific, timeout_ms=2200):
                 logger.info("Selected saved card by number text ending in %s", digits)
                 page.wait_for_timeout(500)
                 return True
 
-    generic = page.get_by_text(re.compile(r"\*{2,}\s*\d{4}")).first
+    generic = page.get_by_text(_SAVED_CARD_PATTERN).first
     if _try_click(generic, timeout_ms=2200):
         logger.info("Selected saved card by visible number text")
         page.wait_for_timeout(500)
@@ -338,7 +612,7 @@ def _select_saved_card_by_last4(page: Page, last4: str, logger: logging.Logger)
         return False
 
     suffix = digits[-4:]
-    pattern = re.compile(rf"(?:\*{{2,}}\s*)?{re.escape(suffix)}\b")
+    pattern = _last4_regex(suffix)
 
     if _click_saved_card_text(page, logger, suffix):
         return True
@@ -386,13 +660,11 @@ def _select_saved_card_by_last4(page: Page, last4: str, logger: logging.Logger)
 
 
 def _select_any_saved_card(page: Page, logger: logging.Logger) -> bool:
-    saved_card_pattern = re.compile(r"\*{2,}\s*\d{4}")
-
     if _click_saved_card_text(page, logger):
         return True
 
     candidates = [
-        page.locator("button,a,label,li,tr,div").filter(has_text=saved_card_pattern).first,
+        page.locator("button,a,label,li,tr,div").filter(has_text=_SAVED_CARD_PATTERN).first,
         page.locator(
             "xpath=//*[contains(normalize-space(.), 'Cartão de crédito')]/following::*[self::button or self::a or self::label or self::li or self::tr or self::div][contains(normalize-space(.), '****')][1]"
         ).first,
@@ -403,7 +675,7 @@ def _select_any_saved_card(page: Page, logger: logging.Logger) -> bool:
             logger.info("Selected first available saved card")
             return True
 
-    card_text = page.get_by_text(saved_card_pattern).first
+    card_text = page.get_by_text(_SAVED_CARD_PATTERN).first
     try:
         card_text.wait_for(state="visible", timeout=1500)
         clickable_ancestor = card_text.locator(
@@ -418,28 +690,22 @@ def _select_any_saved_card(page: Page, logger: logging.Logger) -> bool:
     return False
 
 
-def _click_payment_submit_button(page: Page, config: AppConfig, logger: logging.Logger) -> bool:
-    try:
-        page.mouse.wheel(0, 1200)
-    except PlaywrightError:
-        pass
+def _payment_submit_candidates(page: Page) -> list[Locator]:
+    return [
+        cached_locator(page, "role:button:submit", lambda: page.get_by_role("button", name=_SUBMIT_REGEX).first),
+        cached_locator(page, "role:link:submit", lambda: page.get_by_role("link", name=_SUBMIT_REGEX).first),
+        *(first_locator(page, selector) for selector in _PAYMENT_SUBMIT_SELECTORS),
+    ]
 
+
+def _click_payment_submit_button(page: Page, config: AppConfig, logger: logging.Logger) -> bool:
+    # click() scrolls its own target into view, so nothing is wheeled or scrolled up front.
     if config.pay_submit_selector and config.pay_submit_selector.strip():
         if _try_click(page.locator(config.pay_submit_selector).first, timeout_ms=2500):
             logger.info("Clicked payment submit by PAY_SUBMIT_SELECTOR")
             return True
 
-    submit_regex = re.compile(r"continuar|pagar|concluir|finalizar|confirmar", re.IGNORECASE)
-    for candidate in [
-        page.get_by_role("button", name=submit_regex).first,
-        page.get_by_role("link", name=submit_regex).first,
-        page.locator("button:has-text('Continuar')").first,
-        page.locator("a:has-text('Continuar')").first,
-        page.locator("button:has-text('Pagar')").first,
-        page.locator("button:has-text('Concluir')").first,
-        page.locator("button:has-text('Finalizar')").first,
-        page.locator("a:has-text('Pagar')").first,
-    ]:
+    for candidate in _payment_submit_candidates(page):
         if _try_click(candidate, timeout_ms=2200):
             logger.info("Clicked payment submit by text/role")
             return True
@@ -447,9 +713,14 @@ def _click_payment_submit_button(page: Page, config: AppConfig, logger: logging.
     return False
 
 
-def _payment_otp_modal_input_selectors(config: AppConfig) -> list[str]:
-    return [
-        config.payment_otp_input_selector,
+def _payment_otp_modal_input_selectors(config: AppConfig) -> tuple[str, ...]:
+    return _otp_modal_input_selectors(config.payment_otp_input_selector)
+
+
+@lru_cache(maxsize=8)
+def _otp_modal_input_selectors(configured_selector: str) -> tuple[str, ...]:
+    return (
+        configured_selector,
         "input[data-checkout='securityCodeModal']",
         "input[name='otp']",
         "input[name='codigo']",
@@ -462,39 +733,27 @@ def _payment_otp_modal_input_selectors(config: AppConfig) -> list[str]:
         "input[inputmode='numeric']",
         "input[type='tel']",
         "input[type='text']",
-    ]
-
-
-def _find_visible_in_scope(scope: Locator, selectors: list[str], timeout_ms: int = 1200) -> Locator | None:
-    for selector in selectors:
-        if not selector or not selector.strip():
-            continue
-        locator = scope.locator(selector).first
-        try:
-            locator.wait_for(state="visible", timeout=timeout_ms)
-            return locator
-        except (PlaywrightTimeoutError, PlaywrightError):
-            continue
-    return None
+    )
 
 
 def _otp_submit_feedback_detected(page: Page) -> bool:
-    status_regex = re.compile(
-        r"processando|aguarde|analisando|confirmando|pagamento realizado|pagamento recusado|sucesso|falha|erro|comprovante",
-        re.IGNORECASE,
-    )
     try:
-        return page.get_by_text(status_regex).first.is_visible(timeout=250)
+        return bool(page.evaluate(_FEEDBACK_JS, _FEEDBACK_ARG))
     except PlaywrightError:
         return False
 
 
 def _wait_for_otp_submit_evidence(page: Page, timeout_ms: int = 3500, poll_ms: int = 250) -> str:
-    polls = max(1, timeout_ms // poll_ms)
-    for _ in range(polls):
-        if _otp_submit_feedback_detected(page):
-            return "feedback"
-        page.wait_for_timeout(poll_ms)
+    try:
+        page.wait_for_function(
+            _FEEDBACK_JS,
+            arg=_FEEDBACK_ARG,
+            timeout=timeout_ms,
+            polling=poll_ms,
+        )
+        return "feedback"
+    except PlaywrightError:
+        pass
 
     if _otp_submit_feedback_detected(page):
         return "feedback"
@@ -508,7 +767,9 @@ def _fill_payment_otp_in_modal(page: Page, config: AppConfig, otp: str, logger:
     if modal is None:
         raise AutomationError("Strict payment OTP modal '#confirm-cancel-cvv' not found; refusing to fill code outside modal")
 
-    otp_input = _find_visible_in_scope(modal, _payment_otp_modal_input_selectors(config), timeout_ms=1400)
+    otp_input = find_visible_locator_by_selectors(
+        modal, _payment_otp_modal_input_selectors(config), timeout_ms=1400
+    )
     if otp_input is None:
         raise AutomationError("Payment OTP input is not visible inside confirmation modal")
 
@@ -534,18 +795,21 @@ def _fill_payment_otp_in_modal(page: Page, config: AppConfig, otp: str, logger:
     logger.info("Filled payment OTP inside modal with sequential key presses")
 
 
+def _strict_otp_modal(page: Page) -> Locator:
+    return first_locator(page, _STRICT_OTP_MODAL_SELECTOR)
+
+
 def _find_payment_otp_modal(page: Page):
     if _page_is_closed(page):
         return None
 
-    strict_modal = page.locator("#confirm-cancel-cvv").first
+    strict_modal = _strict_otp_modal(page)
     try:
         if strict_modal.is_visible(timeout=500):
             return strict_modal
     except PlaywrightError:
         pass
 
-    modal_text = re.compile(r"c[oó]digo de seguran|confirma o pagamento", re.IGNORECASE)
     modal_selectors = ["[role='dialog']", ".modal-dialog", ".modal", ".ui-dialog", ".swal2-popup"]
     for selector in modal_selectors:
         modal = page.locator(selector).first
@@ -554,33 +818,12 @@ def _find_payment_otp_modal(page: Page):
         except (PlaywrightTimeoutError, PlaywrightError):
             continue
 
-        has_text = False
-        has_otp_input = False
-        has_confirm = False
-        try:
-            has_text = modal.get_by_text(modal_text).first.is_visible(timeout=300)
-        except PlaywrightError:
-            has_text = False
-        try:
-            has_otp_input = (
-                modal.locator("input[data-checkout='securityCodeModal']").first.is_visible(timeout=300)
-                or modal.locator("input[name='otp']").first.is_visible(timeout=300)
-                or modal.locator("input[name*='codigo']").first.is_visible(timeout=300)
-                or modal.locator("input[id*='codigo']").first.is_visible(timeout=300)
-                or modal.locator("input[placeholder*='Código']").first.is_visible(timeout=300)
-                or modal.locator("input[placeholder*='codigo']").first.is_visible(timeout=300)
-            )
-        except PlaywrightError:
-            has_otp_input = False
         try:
-            has_confirm = (
-                modal.locator("#confirmarModalConfirmacao").first.is_visible(timeout=300)
-                or modal.locator("button:has-text('Confirmar')").first.is_visible(timeout=300)
-            )
+            flags = modal.evaluate(_OTP_MODAL_FLAGS_JS, _OTP_MODAL_INPUT_SELECTORS)
         except PlaywrightError:
-            has_confirm = False
+            continue
 
-        if (has_text and has_confirm) or has_otp_input:
+        if (flags["text"] and flags["confirm"]) or flags["otp"]:
             return modal
 
     return None
@@ -589,7 +832,7 @@ def _find_payment_otp_modal(page: Page):
 def _find_strict_payment_otp_modal(page: Page):
     if _page_is_closed(page):
         return None
-    strict_modal = page.locator("#confirm-cancel-cvv").first
+    strict_modal = _strict_otp_modal(page)
     try:
         strict_modal.wait_for(state="visible", timeout=700)
         return strict_modal
@@ -613,55 +856,37 @@ def _otp_strict_modal_still_visible(page: Page) -> bool:
         return False
 
 
-def _looks_like_modal_dismiss_action(candidate: Locator) -> bool:
-    confirm_regex = re.compile(
-        r"confirmar|confirmo|continuar|enviar|validar|pagar|concluir|prosseguir|finalizar|ok",
-        re.IGNORECASE,
-    )
-    dismiss_regex = re.compile(
-        r"\b(fechar|cancelar|voltar|corrigir|nao|n\u00e3o|close|dismiss|btn-close|modal-close)\b|(^|\s)x(\s|$)",
-        re.IGNORECASE,
-    )
-    snippets: list[str] = []
+def _element_metadata(candidate: Locator) -> dict[str, str]:
+    try:
+        metadata = candidate.evaluate(_ELEMENT_METADATA_JS, _ELEMENT_METADATA_ATTRIBUTES, timeout=1000)
+    except PlaywrightError:
+        return {}
+    return {key: (value or "").strip() for key, value in metadata.items()}
 
-    for getter in [
-        lambda: candidate.inner_text(timeout=250),
-        lambda: candidate.get_attribute("value"),
-        lambda: candidate.get_attribute("aria-label"),
-        lambda: candidate.get_attribute("title"),
-        lambda: candidate.get_attribute("id"),
-        lambda: candidate.get_attribute("class"),
-        lambda: candidate.get_attribute("name"),
-        lambda: candidate.get_attribute("data-dismiss"),
-        lambda: candidate.get_attribute("data-bs-dismiss"),
-        lambda: candidate.get_attribute("data-action"),
-        lambda: candidate.get_attribute("onclick"),
-    ]:
-        try:
-            value = getter()
-        except PlaywrightError:
-            value = None
-        if value and value.strip():
-            snippets.append(value.strip())
 
-    combined = " ".join(snippets)
+def _looks_like_modal_dismiss_action(candidate: Locator) -> bool:
+    metadata = _element_metadata(candidate)
+    snippets = [
+        metadata.get(key, "")
+        for key in ["text", "value", "aria-label", "title", "id", "class", "name", "data-dismiss", "data-bs-dismiss", "data-action", "onclick"]
+    ]
+
+    combined = " ".join(snippet for snippet in snippets if snippet)
     if not combined:
         return False
 
-    looks_confirm_action = confirm_regex.search(combined) is not None and dismiss_regex.search(combined) is None
+    looks_confirm_action = _CONFIRM_REGEX.search(combined) is not None and _DISMISS_REGEX.search(combined) is None
 
     for hard_dismiss_attr in ["data-dismiss", "data-bs-dismiss"]:
-        try:
-            attr_value = candidate.get_attribute(hard_dismiss_attr)
-        except PlaywrightError:
-            attr_value = None
+        attr_value = metadata.get(hard_dismiss_attr, "")
         if attr_value and "modal" in attr_value.lower() and not looks_confirm_action:
             return True
 
-    return dismiss_regex.search(combined) is not None and not looks_confirm_action
+    return _DISMISS_REGEX.search(combined) is not None and not looks_confirm_action
 
 
 def _describe_click_candidate(candidate: Locator) -> str:
+    metadata = _element_metadata(candidate)
     snippets: list[str] = []
     fields = [
         "id",
@@ -675,17 +900,10 @@ def _describe_click_candidate(candidate: Locator) -> str:
         "type",
     ]
     for field in fields:
-        try:
-            value = candidate.get_attribute(field)
-        except PlaywrightError:
-            value = None
-        if value and value.strip():
-            snippets.append(f"{field}={value.strip()}")
-    try:
-        text = candidate.inner_text(timeout=250)
-    except PlaywrightError:
-        text = ""
-    text = " ".join(text.split())
+        value = metadata.get(field, "")
+        if value:
+            snippets.append(f"{field}={value}")
+    text = " ".join(metadata.get("text", "").split())
     if text:
         snippets.append(f"text={text[:80]}")
     return "; ".join(snippets) if snippets else "no-metadata"
@@ -701,13 +919,11 @@ def _click_payment_otp_submit_button(page: Page, config: AppConfig, logger: logg
         return False
 
     if config.payment_otp_submit_selector and config.payment_otp_submit_selector.strip():
-        sel = modal.locator(config.payment_otp_submit_selector)
         try:
-            count = sel.count()
+            configured_candidates = modal.locator(config.payment_otp_submit_selector).all()
         except PlaywrightError:
-            count = 0
-        for idx in range(count):
-            candidate = sel.nth(idx)
+            configured_candidates = []
+        for candidate in configured_candidates:
             if _looks_like_modal_dismiss_action(candidate):
                 candidate_text = _describe_click_candidate(candidate)
                 if "Confirmar" in candidate_text or "confirmarModalConfirmacao" in candidate_text:
@@ -738,20 +954,19 @@ def _click_payment_otp_submit_button(page: Page, config: AppConfig, logger: logg
 
     modal_locators = [
         modal.locator("#confirmarModalConfirmacao"),
-        modal.get_by_role("button", name=re.compile(r"confirmar", re.IGNORECASE)),
+        modal.get_by_role("button", name=_CONFIRMAR_REGEX),
         modal.locator("button:has-text('Confirmar')"),
         modal.locator("a:has-text('Confirmar')"),
         modal.locator("input[type='button'][value*='Confirmar']"),
         modal.locator("input[type='submit'][value*='Confirmar']"),
-        modal.locator("button").filter(has_text=re.compile(r"confirmar|continuar|enviar|validar", re.IGNORECASE)),
+        modal.locator("button").filter(has_text=_OTP_SUBMIT_TEXT_REGEX),
     ]
     for loc in modal_locators:
         try:
-            count = loc.count()
+            candidates = loc.all()
         except PlaywrightError:
-            count = 0
-        for idx in range(count):
-            candidate = loc.nth(idx)
+            candidates = []
+        for candidate in candidates:
             try:
                 candidate.wait_for(state="visible", timeout=900)
             except (PlaywrightTimeoutError, PlaywrightError):
@@ -796,58 +1011,26 @@ def _click_payment_otp_submit_button(page: Page, config: AppConfig, logger: logg
     return False
 
 
-def _is_confirmation_modal_visible(page: Page) -> bool:
-    if _page_is_closed(page):
-        return False
+def _handle_checkout_confirmation_modal(page: Page, logger: logging.Logger, timeout_ms: int = 8000) -> bool:
     try:
-        dialogs = page.locator("[role='dialog']")
-        if dialogs.count() > 0 and dialogs.first.is_visible(timeout=300):
-            return True
+        state = page.evaluate(_CONFIRMATION_STATE_JS, list(_CONFIRMATION_MODAL_SELECTORS))
     except PlaywrightError:
-        pass
-
-    modal_selectors = [".modal", ".modal-dialog", ".ui-dialog", ".swal2-popup"]
-    for selector in modal_selectors:
-        locator = page.locator(selector).first
-        try:
-            if locator.is_visible(timeout=300):
-                return True
-        except PlaywrightError:
-            continue
-    return False
-
-
-def _handle_checkout_confirmation_modal(page: Page, logger: logging.Logger, timeout_ms: int = 8000) -> bool:
-    if not (
-        _is_confirmation_modal_visible(page)
-        or text_exists(page, "Confirma", exact=False, timeout_ms=700)
-        or text_exists(page, "Valor total", exact=False, timeout_ms=700)
-    ):
         return False
-
-    confirm_candidates = [
-        page.get_by_role("button", name=re.compile(r"confirmar|confirmo|sim", re.IGNORECASE)).first,
-        page.locator("button:has-text('Confirmar')").first,
-        page.locator("a:has-text('Confirmar')").first,
-        page.get_by_text(re.compile(r"confirmar", re.IGNORECASE)).first,
-    ]
-
-    for candidate in confirm_candidates:
-        if _try_click(candidate, timeout_ms=2000):
-            logger.info("Checkout confirmation modal detected; clicked Confirmar")
-            page.wait_for_timeout(500)
-            break
-    else:
+    if not (state["modal"] or state["confirma"] or state["total"]):
         return False
 
-    max_polls = max(1, timeout_ms // 250)
-    for _ in range(max_polls):
-        still_visible = _is_confirmation_modal_visible(page)
-        still_text = text_exists(page, "Confirma", exact=False, timeout_ms=250)
-        if not still_visible and not still_text:
-            return True
-        page.wait_for_timeout(250)
+    confirm = page.locator(_CLICKABLE_SELECTOR).filter(has_text=_CHECKOUT_CONFIRM_REGEX, visible=True).first
+    if not _try_click(confirm, timeout_ms=2000):
+        return False
+    logger.info("Checkout confirmation modal detected; clicked Confirmar")
+    page.wait_for_timeout(500)
 
+    try:
+        page.wait_for_function(
+            _CONFIRMATION_MODAL_CLOSED_JS, arg=list(_CONFIRMATION_MODAL_SELECTORS), timeout=timeout_ms
+        )
+    except PlaywrightError:
+        pass
     return True
 
 
@@ -855,53 +1038,31 @@ def _wait_for_payment_processing_result(
     page: Page, config: AppConfig, logger: logging.Logger, timeout_ms: int = 90000
 ) -> str:
     logger.info("Waiting payment processing confirmation")
-    polls = max(1, timeout_ms // 500)
-
-    success_regex = re.compile(r"pagamento realizado|aposta(s)? realizada(s)?|sucesso|comprovante", re.IGNORECASE)
-    failure_regex = re.compile(r"pagamento recusado|n[oã]o autorizado|falha|erro|negado", re.IGNORECASE)
-    pending_regex = re.compile(r"processando|aguarde|analisando|confirmando", re.IGNORECASE)
-
-    for _ in range(polls):
-        if _page_is_closed(page):
-            return "unknown"
-
-        if config.success_text and text_exists(page, config.success_text, exact=False, timeout_ms=400):
-            return "success"
-        if config.failure_text and text_exists(page, config.failure_text, exact=False, timeout_ms=300):
-            return "failure"
-
-        try:
-            if page.get_by_text(success_regex).first.is_visible(timeout=300):
-                return "success"
-        except PlaywrightError:
-            pass
-        try:
-            if page.get_by_text(failure_regex).first.is_visible(timeout=300):
-                return "failure"
-        except PlaywrightError:
-            pass
+    success = page.get_by_text(_PAYMENT_SUCCESS_REGEX)
+    failure = page.get_by_text(_PAYMENT_FAILURE_REGEX)
+    configured_success = page.get_by_text(config.success_text) if config.success_text else None
+    configured_failure = page.get_by_text(config.failure_text) if config.failure_text else None
+    markers = [locator for locator in (configured_success, configured_failure, success, failure) if locator is not None]
 
-        otp_modal_open = _is_confirmation_modal_visible(page) and text_exists(
-            page, "código de Segurança", exact=False, timeout_ms=250
-        )
-        pending_visible = False
-        try:
-            pending_visible = page.get_by_text(pending_regex).first.is_visible(timeout=250)
-        except PlaywrightError:
-            pending_visible = False
-
-        if otp_modal_open or pending_visible:
-            try:
-                page.wait_for_timeout(500)
-            except PlaywrightError:
-                return "unknown"
+    try:
+        expect(first_visible_of(*markers)).to_be_visible(timeout=timeout_ms)
+    except (AssertionError, PlaywrightError):
+        return "unknown"
+
+    # Same precedence as before: configured texts win over the generic patterns.
+    for locator, result in (
+        (configured_success, "success"),
+        (configured_failure, "failure"),
+        (success, "success"),
+        (failure, "failure"),
+    ):
+        if locator is None:
             continue
-
         try:
-            page.wait_for_timeout(500)
+            if locator.filter(visible=True).count() > 0:
+                return result
         except PlaywrightError:
             return "unknown"
-
     return "unknown"
 
 
@@ -918,9 +1079,58 @@ def _validate_total(page: Page, config: AppConfig) -> None:
         raise AutomationError(f"Expected total text not found on page: {config.expected_total}")
 
 
+def _card_form_fields(config: AppConfig) -> dict[str, tuple[str, list[str]]]:
+    return {
+        "holder": (
+            config.card_holder_name,
+            [
+                config.card_holder_selector,
+                "input[name='cardHolder']",
+                "input[name='holderName']",
+                "input[autocomplete='cc-name']",
+            ],
+        ),
+        "number": (
+            config.card_number,
+            [
+                config.card_number_selector,
+                "input[name='cardNumber']",
+                "input[autocomplete='cc-number']",
+                "input[inputmode='numeric']",
+            ],
+        ),
+        "exp_month": (
+            config.card_exp_month,
+            [
+                config.card_exp_month_selector,
+                "input[name='expMonth']",
+                "input[autocomplete='cc-exp-month']",
+            ],
+        ),
+        "exp_year": (
+            config.card_exp_year,
+            [
+                config.card_exp_year_selector,
+                "input[name='expYear']",
+                "input[autocomplete='cc-exp-year']",
+                "input[autocomplete='cc-exp']",
+            ],
+        ),
+        "cvv": (
+            config.card_cvv,
+            [
+                config.card_cvv_selector,
+                "input[name='cvv']",
+                "input[name='securityCode']",
+                "input[autocomplete='cc-csc']",
+            ],
+        ),
+    }
+
+
 def _select_or_fill_card(page: Page, config: AppConfig, logger: logging.Logger) -> None:
     if text_exists(page, "Cartão de crédito", exact=False, timeout_ms=1000):
-        _try_click(page.get_by_text(re.compile(r"cart[aã]o de cr[eé]dito", re.IGNORECASE)).first, timeout_ms=1200)
+        _try_click(page.get_by_text(_CREDIT_CARD_REGEX).first, timeout_ms=1200)
 
     if config.use_saved_card:
         if config.saved_card_selector:
@@ -928,107 +1138,84 @@ def _select_or_fill_card(page: Page, config: AppConfig, logger: logging.Logger)
             logger.info("Selected saved card using selector")
             return
         if config.saved_card_text:
-            if _try_click(page.get_by_text(re.compile(re.escape(config.saved_card_text), re.IGNORECASE)).first, timeout_ms=2200):
+            if _try_click(page.get_by_text(config.saved_card_regex).first, timeout_ms=2200):
                 logger.info("Selected saved card using text")
-                _wait_for_payment_submit(page, config, timeout_ms=5000)
                 return
             click_by_text(page, config.saved_card_text, exact=False)
             logger.info("Selected saved card using text fallback")
-            _wait_for_payment_submit(page, config, timeout_ms=5000)
             return
         if config.saved_card_last4:
             if _select_saved_card_by_last4(page, config.saved_card_last4, logger):
-                _wait_for_payment_submit(page, config, timeout_ms=5000)
                 return
             logger.info("SAVED_CARD_LAST4 was provided but no matching card was clickable")
         if _select_any_saved_card(page, logger):
-            _wait_for_payment_submit(page, config, timeout_ms=5000)
             return
         logger.info("USE_SAVED_CARD=true but no saved card selector/text provided; falling back to card form")
 
-    fill_first_available(
-        page,
-        config.card_holder_name,
-        [
-            config.card_holder_selector,
-            "input[name='cardHolder']",
-            "input[name='holderName']",
-            "input[autocomplete='cc-name']",
-        ],
-    )
-    fill_first_available(
-        page,
-        config.card_number,
-        [
-            config.card_number_selector,
-            "input[name='cardNumber']",
-            "input[autocomplete='cc-number']",
-            "input[inputmode='numeric']",
-        ],
-    )
-    fill_first_available(
-        page,
-        config.card_exp_month,
-        [
-            config.card_exp_month_selector,
-            "input[name='expMonth']",
-            "input[autocomplete='cc-exp-month']",
-        ],
-    )
-    fill_first_available(
-        page,
-        config.card_exp_year,
-        [
-            config.card_exp_year_selector,
-            "input[name='expYear']",
-            "input[autocomplete='cc-exp-year']",
-            "input[autocomplete='cc-exp']",
-        ],
-    )
-    fill_first_available(
-        page,
-        config.card_cvv,
-        [
-            config.card_cvv_selector,
-            "input[name='cvv']",
-            "input[name='securityCode']",
-            "input[autocomplete='cc-csc']",
-        ],
-    )
+    fields = _card_form_fields(config)
+    payload = [[name, value, selectors] for name, (value, selectors) in fields.items()]
+    try:
+        unfilled = set(page.evaluate(_BULK_FILL_JS, payload))
+    except PlaywrightError:
+        unfilled = set(fields)
+    for name, (value, selectors) in fields.items():
+        if name in unfilled:
+            fill_first_available(page, value, selectors)
 
 
 def run_checkout_and_payment(page: Page, config: AppConfig, logger: logging.Logger, run_dir: Path) -> None:
+    try:
+        _run_checkout_and_payment(page, config, logger, run_dir)
+    finally:
+        flush_snapshots(run_dir, logger)
+
+
+def _run_checkout_and_payment(page: Page, config: AppConfig, logger: logging.Logger, run_dir: Path) -> None:
     logger.info("Opening cart before checkout")
     if not _open_cart(page, config, logger):
         raise AutomationError("Could not open cart from favorites page")
     if not _is_cart_page(page):
         raise AutomationError("Cart page was not detected after cart open click")
-    save_snapshot(page, run_dir, "cart_opened")
+    save_snapshot_async(page, run_dir, "cart_opened")
 
     logger.info("Going to checkout")
     if not _click_checkout(page, config, logger):
         raise AutomationError("Could not find checkout action from cart page")
-    save_snapshot(page, run_dir, "checkout_opened")
+    save_snapshot_async(page, run_dir, "checkout_opened")
 
     _handle_checkout_confirmation_modal(page, logger)
 
     logger.info("Validating expected total")
-    _validate_total(page, config)
-
-    _handle_checkout_confirmation_modal(page, logger)
+    try:
+        _validate_total(page, config)
+    except AutomationError:
+        # A late confirmation modal can cover the total; clear it and validate once more.
+        if not _handle_checkout_confirmation_modal(page, logger):
+            raise
+        _validate_total(page, config)
 
     logger.info("Preparing payment method")
     _select_or_fill_card(page, config, logger)
-    save_snapshot(page, run_dir, "payment_form_ready")
+    _wait_for_payment_submit(page, config, timeout_ms=6000)
+    save_snapshot_async(page, run_dir, "payment_form_ready")
 
     logger.info("Submitting payment")
-    _wait_for_payment_submit(page, config, timeout_ms=6000)
     if not _click_payment_submit_button(page, config, logger):
         raise AutomationError("No visible payment submit button found")
-    save_snapshot(page, run_dir, "payment_submitted")
+    save_snapshot_async(page, run_dir, "payment_submitted")
 
     logger.info("Waiting for payment OTP/challenge")
-    otp = input("Enter payment code: ").strip()
+    # Resolve the OTP modal on this thread while the user is still typing the code; the prompt reader hands
+    # lines to prompts in order, so nothing left over from login can take this code.
+    otp_future = prompt_code_async("Enter payment code: ")
+    try:
+        try:
+            _strict_otp_modal(page).wait_for(state="visible", timeout=30000)
+        except PlaywrightError:
+            pass
+        otp = otp_future.result()
+    finally:
+        cancel_prompt(otp_future)
     if not otp:
         raise AutomationError("Payment OTP cannot be empty")
 
@@ -1059,10 +1246,10 @@ def run_checkout_and_payment(page: Page, config: AppConfig, logger: logging.Logg
         if _otp_strict_modal_still_visible(page):
             raise AutomationError("Payment OTP modal is still open after modal-scoped confirm clicks")
         if closed_without_feedback:
-            save_snapshot(page, run_dir, "payment_otp_closed_no_feedback")
+            save_snapshot_async(page, run_dir, "payment_otp_closed_no_feedback")
         raise AutomationError("OTP modal closed without payment processing confirmation markers")
 
-    save_snapshot(page, run_dir, "payment_otp_submitted")
+    save_snapshot_async(page, run_dir, "payment_otp_submitted")
 
     try:
         visible_locator_by_selectors(page, ["body"], timeout_ms=4000)
@@ -1072,13 +1259,13 @@ def run_checkout_and_payment(page: Page, config: AppConfig, logger: logging.Logg
     result = _wait_for_payment_processing_result(page, config, logger, timeout_ms=90000)
     if result == "success":
         logger.info("Payment success text detected")
-        save_snapshot(page, run_dir, "payment_success")
+        save_snapshot_async(page, run_dir, "payment_success")
         return
 
     if result == "failure":
-        save_snapshot(page, run_dir, "payment_failure")
+        save_snapshot_async(page, run_dir, "payment_failure", full=True, fmt="png")
         raise AutomationError(f"Payment failure text detected: {config.failure_text or 'failure marker found'}")
 
     logger.info("Payment status not confirmed within wait timeout")
-    save_snapshot(page, run_dir, "payment_result_unknown")
+    save_snapshot_async(page, run_dir, "payment_result_unknown", full=True, fmt="png")
     raise AutomationError("Payment was submitted but final confirmation was not detected within timeout")
@@ -2,18 +2,33 @@ from __future__ import annotations
 
 import logging
 import re
-import time
 import unicodedata
 from pathlib import Path
 
 from playwright.sync_api import Error as PlaywrightError
-from playwright.sync_api import Page
+from playwright.sync_api import Locator, Page
 from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
 
 from ..config import AppConfig
 from ..errors import AutomationError
-from ..utils.snapshots import save_snapshot
-from ..utils.ui import visible_locator_by_selectors
+from ..utils.snapshots import flush_snapshots, save_snapshot_async
+from ..utils.ui import cached_locator, first_visible_of, visible_locator_by_selectors
+
+_MENU_REGEX = re.compile(r"menu|navega", re.IGNORECASE)
+_FAVORITES_REGEX = re.compile(r"carrinh(?:o|os)\s+favorit", re.IGNORECASE)
+# The first probe after login also waits out the header render; later ones only need the actionability checks.
+_FIRST_PROBE_MS = 2200
+_FAST_PROBE_MS = 500
+# In priority order: a union selector would return whichever matches first in the DOM instead.
+_ADD_TO_CART_SELECTORS = (
+    "a[title*='adicionar' i], button[title*='adicionar' i]",
+    "a[aria-label*='adicionar' i], button[aria-label*='adicionar' i]",
+    "a:has(.fa-shopping-cart), button:has(.fa-shopping-cart)",
+)
+# Positional fallback only: the first action in the last cell is not always add-to-cart, so it is tried last.
+_LAST_CELL_ACTIONS_SELECTOR = "td:last-child a, td:last-child button"
+# Covers the Portuguese accents in C; anything still non-ASCII afterwards goes through the NFKD fallback.
+_ACCENT_TABLE = str.maketrans("áàâãäéèêëíìîïóòôõöúùûüçñ", "aaaaaeeeeiiiiooooouuuucn")
 
 
 def _try_click(locator, timeout_ms: int = 1800) -> bool:
@@ -39,7 +54,7 @@ def _open_menu_if_needed(page: Page, logger: logging.Logger) -> bool:
             page.wait_for_timeout(400)
             return True
 
-    if _try_click(page.get_by_role("button", name=re.compile(r"menu|navega", re.IGNORECASE)).first):
+    if _try_click(page.get_by_role("button", name=_MENU_REGEX).first):
         logger.info("Opened navigation menu by role")
         page.wait_for_timeout(400)
         return True
@@ -47,23 +62,30 @@ def _open_menu_if_needed(page: Page, logger: logging.Logger) -> bool:
     return False
 
 
-def _favorite_entry_candidates(page: Page, config: AppConfig) -> list:
-    favorite_regex = re.compile(r"carrinh(?:o|os)\s+favorit", re.IGNORECASE)
+def _favorite_entry_candidates(page: Page, config: AppConfig) -> list[Locator]:
+    # Locators are lazy, so the candidates can be reused for every retry on the same page.
+    key = f"favorites-entry:{config.favorites_entry_text or ''}"
+    return cached_locator(page, key, lambda: _build_favorite_entry_candidates(page, config))
+
+
+def _build_favorite_entry_candidates(page: Page, config: AppConfig) -> list[Locator]:
     candidates = [
-        page.get_by_role("link", name=favorite_regex).first,
-        page.get_by_role("button", name=favorite_regex).first,
-        page.get_by_role("menuitem", name=favorite_regex).first,
-        page.locator("a,button").filter(has_text=favorite_regex).first,
+        first_visible_of(
+            page.get_by_role("link", name=_FAVORITES_REGEX),
+            page.get_by_role("button", name=_FAVORITES_REGEX),
+            page.get_by_role("menuitem", name=_FAVORITES_REGEX),
+            page.locator("a,button").filter(has_text=_FAVORITES_REGEX),
+        )
     ]
 
     if config.favorites_entry_text:
-        text_regex = re.compile(re.escape(config.favorites_entry_text), re.IGNORECASE)
-        candidates.extend(
-            [
-                page.get_by_role("link", name=text_regex).first,
-                page.get_by_role("button", name=text_regex).first,
-                page.get_by_role("menuitem", name=text_regex).first,
-            ]
+        text_regex = config.favorites_entry_regex
+        candidates.append(
+            first_visible_of(
+                page.get_by_role("link", name=text_regex),
+                page.get_by_role("button", name=text_regex),
+                page.get_by_role("menuitem", name=text_regex),
+            )
         )
 
     return candidates
@@ -90,13 +112,17 @@ def _open_account_menu(page: Page, config: AppConfig, logger: logging.Logger) ->
             return True
 
     account_text = (config.account_menu_text or "Minha Conta").strip() or "Minha Conta"
-    account_regex = re.compile(re.escape(account_text), re.IGNORECASE)
-    for candidate in [
-        page.get_by_role("button", name=account_regex).first,
-        page.get_by_role("link", name=account_regex).first,
-        page.get_by_text(account_regex).first,
+    account_regex = config.account_menu_regex
+    for timeout_ms, candidate in [
+        (
+            _FIRST_PROBE_MS,
+            first_visible_of(
+                page.get_by_role("button", name=account_regex), page.get_by_role("link", name=account_regex)
+            ),
+        ),
+        (_FAST_PROBE_MS, page.get_by_text(account_regex).first),
     ]:
-        if _try_click(candidate, timeout_ms=2200):
+        if _try_click(candidate, timeout_ms=timeout_ms):
             logger.info("Opened account menu by text: %s", account_text)
             return True
 
@@ -111,7 +137,7 @@ def _open_favorites_section(page: Page, config: AppConfig, logger: logging.Logge
         return True
 
     if _open_account_menu(page, config, logger):
-        save_snapshot(page, run_dir, "account_menu_opened")
+        save_snapshot_async(page, run_dir, "account_menu_opened")
         page.wait_for_timeout(500)
         if _try_open_favorites_direct(page, config, logger):
             logger.info("Opened favorites section after opening account/menu")
@@ -121,82 +147,59 @@ def _open_favorites_section(page: Page, config: AppConfig, logger: logging.Logge
 
 
 def _wait_for_favorites_list(page: Page, timeout_ms: int = 20000) -> bool:
-    deadline = time.monotonic() + (timeout_ms / 1000)
-    spinner_selectors = [
-        ".fa-spinner",
-        ".spinner",
-        "img[src*='loading' i]",
-        "[class*='loading' i]",
-    ]
-
-    while time.monotonic() < deadline:
-        rows = page.locator("table tbody tr")
-        if rows.count() > 0:
-            return True
-
-        if page.locator("table").count() > 0:
-            for selector in spinner_selectors:
-                try:
-                    if page.locator(selector).first.is_visible(timeout=300):
-                        page.wait_for_timeout(300)
-                        break
-                except PlaywrightError:
-                    continue
-            else:
-                page.wait_for_timeout(250)
-        else:
-            page.wait_for_timeout(250)
-
-    return False
+    try:
+        page.locator("table tbody tr").first.wait_for(state="attached", timeout=timeout_ms)
+        return True
+    except (PlaywrightTimeoutError, PlaywrightError):
+        return False
 
 
 def _normalize_text(value: str) -> str:
-    lowered = value.strip().lower()
-    normalized = unicodedata.normalize("NFKD", lowered)
-    without_marks = "".join(ch for ch in normalized if not unicodedata.combining(ch))
-    return " ".join(without_marks.split())
+    clean = value.lower().translate(_ACCENT_TABLE)
+    if not clean.isascii():
+        clean = "".join(ch for ch in unicodedata.normalize("NFKD", clean) if not unicodedata.combining(ch))
+    return " ".join(clean.split())
 
 
-def _find_favorite_row(page: Page, favorite_name: str):
+def _find_favorite_row(page: Page, favorite_name: str) -> Locator | None:
     target = _normalize_text(favorite_name)
     rows = page.locator("table tbody tr")
-    count = rows.count()
-    for idx in range(count):
-        row = rows.nth(idx)
-        try:
-            text = row.inner_text(timeout=1200)
-        except PlaywrightTimeoutError:
-            continue
-        if target in _normalize_text(text):
-            return row
-    return None
+    try:
+        texts = rows.all_inner_texts()
+    except PlaywrightError:
+        return None
+    idx = next((idx for idx, text in enumerate(texts) if target in _normalize_text(text)), None)
+    if idx is None:
+        return None
+    # A locator rather than a handle, so an Angular re-render of the table does not leave a detached row behind.
+    return rows.nth(idx)
 
 
 def _visible_favorite_names(page: Page) -> list[str]:
-    names = page.locator("table tbody tr td:first-child")
-    result: list[str] = []
-    for idx in range(names.count()):
-        try:
-            name = names.nth(idx).inner_text(timeout=800).strip()
-        except PlaywrightTimeoutError:
-            continue
-        if name:
-            result.append(name)
-    return result
-
-
-def _click_add_to_cart_in_row(row, logger: logging.Logger) -> bool:
-    action_candidates = [
-        row.locator("a[title*='adicionar' i],button[title*='adicionar' i]").first,
-        row.locator("a[aria-label*='adicionar' i],button[aria-label*='adicionar' i]").first,
-        row.locator("a:has(i.fa-shopping-cart),button:has(i.fa-shopping-cart)").first,
-        row.locator("a:has(.fa-shopping-cart),button:has(.fa-shopping-cart)").first,
-        row.locator("td:last-child a, td:last-child button").nth(1),
-        row.locator("td:last-child a, td:last-child button").first,
-    ]
+    try:
+        names = page.locator("table tbody tr td:first-child").all_inner_texts()
+    except PlaywrightError:
+        return []
+    return [name.strip() for name in names if name.strip()]
+
+
+def _try_click_present(locator: Locator, timeout_ms: int = 2000) -> bool:
+    # count() is instant, so actions the row does not have are skipped without paying the visibility wait.
+    try:
+        if locator.count() == 0:
+            return False
+    except PlaywrightError:
+        return False
+    return _try_click(locator, timeout_ms=timeout_ms)
+
+
+def _click_add_to_cart_in_row(row: Locator, logger: logging.Logger) -> bool:
+    last_cell_actions = row.locator(_LAST_CELL_ACTIONS_SELECTOR)
+    action_candidates = [row.locator(selector).first for selector in _ADD_TO_CART_SELECTORS]
+    action_candidates += [last_cell_actions.nth(1), last_cell_actions.first]
 
     for candidate in action_candidates:
-        if _try_click(candidate, timeout_ms=2000):
+        if _try_click_present(candidate):
             logger.info("Clicked add-to-cart action in favorite row")
             return True
 
@@ -204,15 +207,21 @@ def _click_add_to_cart_in_row(row, logger: logging.Logger) -> bool:
 
 
 def run_favorites_flow(page: Page, config: AppConfig, logger: logging.Logger, run_dir: Path) -> None:
+    try:
+        _run_favorites_flow(page, config, logger, run_dir)
+    finally:
+        flush_snapshots(run_dir, logger)
+
+
+def _run_favorites_flow(page: Page, config: AppConfig, logger: logging.Logger, run_dir: Path) -> None:
     logger.info("Opening favorites/cart section")
     if not _open_favorites_section(page, config, logger, run_dir):
         raise AutomationError("Could not open favorite cart section")
 
-    save_snapshot(page, run_dir, "favorites_opened")
-
     logger.info("Waiting favorites list to load")
     if not _wait_for_favorites_list(page, timeout_ms=20000):
         raise AutomationError("Favorites list did not load in time")
+    save_snapshot_async(page, run_dir, "favorites_opened")
 
     logger.info("Finding favorite item row and clicking add-to-cart action")
     row = _find_favorite_row(page, config.favorite_item_name_exact)
@@ -228,7 +237,7 @@ def run_favorites_flow(page: Page, config: AppConfig, logger: logging.Logger, ru
     elif not _click_add_to_cart_in_row(row, logger):
         raise AutomationError("Favorite row found, but no clickable add-to-cart action was detected")
 
-    save_snapshot(page, run_dir, "favorite_item_added")
+    save_snapshot_async(page, run_dir, "favorite_item_added")
 
     cart_badges = [
         "[data-testid='cart-count']",
@@ -3,6 +3,7 @@ from __future__ import annotations
 import logging
 import re
 import time
+from functools import lru_cache
 from pathlib import Path
 
 from playwright.sync_api import Error as PlaywrightError
@@ -11,129 +12,186 @@ from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
 
 from ..config import AppConfig
 from ..errors import AutomationError
-from ..utils.snapshots import save_snapshot
+from ..utils.prompt import cancel_prompt, prompt_code_async
+from ..utils.snapshots import flush_snapshots, save_snapshot_async
 from ..utils.ui import (
+    VISIBLE_ELEMENT_JS,
     any_visible_by_selectors,
     click_if_present_by_selectors,
     click_if_present_by_text,
+    dom_css_union,
     find_visible_locator_by_selectors,
+    first_locator,
     fill_first_available,
-    text_exists,
+    is_dom_css,
+    text_flags,
 )
 
 
-def _username_selectors(config: AppConfig) -> list[str]:
-    return [
-        config.login_username_selector,
-        "input[name='username']",
-        "input[autocomplete='username']",
-        "input[name='cpf']",
-        "input[name*='cpf']",
-        "input[id*='cpf']",
-        "input[placeholder*='CPF']",
-        "input[placeholder*='cpf']",
-        "input[aria-label*='CPF']",
-        "input[aria-label*='cpf']",
-        "input[type='text']",
-        "input[type='email']",
-    ]
+_LOGIN_HOST = "login.caixa.gov.br"
+_LOGIN_SUBMIT_REGEX = re.compile(r"entrar|acessar|continuar", re.IGNORECASE)
+_LOGIN_OTP_SUBMIT_REGEX = re.compile(r"enviar|confirmar|validar", re.IGNORECASE)
+_RECEIVE_CODE_REGEX = re.compile(r"receber\s+c[oó]digo", re.IGNORECASE)
+
+
+# Ordered narrow to broad, with the Caixa field names first: the union wait resolves its winner by walking this
+# order, so likely hits up front keep that walk short and the bare input[type=...] fallbacks stay last.
+_USERNAME_SELECTORS = (
+    "input[name='cpf']",
+    "input[name='username']",
+    "input[autocomplete='username']",
+    "input[name*='cpf']",
+    "input[id*='cpf']",
+    "input[placeholder*='CPF']",
+    "input[placeholder*='cpf']",
+    "input[aria-label*='CPF']",
+    "input[aria-label*='cpf']",
+    "input[type='text']",
+    "input[type='email']",
+)
 
+_PASSWORD_SELECTORS = (
+    "input[name='senha']",
+    "input[name='password']",
+    "input[autocomplete='current-password']",
+    "input[name*='senha']",
+    "input[id*='senha']",
+    "input[placeholder*='Senha']",
+    "input[placeholder*='senha']",
+    "input[aria-label*='Senha']",
+    "input[aria-label*='senha']",
+    "input[type='password']",
+)
 
-def _password_selectors(config: AppConfig) -> list[str]:
-    return [
-        config.login_password_selector,
-        "input[name='password']",
-        "input[autocomplete='current-password']",
-        "input[name='senha']",
-        "input[name*='senha']",
-        "input[id*='senha']",
-        "input[placeholder*='Senha']",
-        "input[placeholder*='senha']",
-        "input[aria-label*='Senha']",
-        "input[aria-label*='senha']",
-        "input[type='password']",
-    ]
+_LOGIN_OTP_SELECTORS = (
+    "input[name='codigo']",
+    "input[name='otp']",
+    "input[name*='codigo']",
+    "input[id*='codigo']",
+    "input[placeholder*='Código']",
+    "input[placeholder*='codigo']",
+    "input[placeholder*='código']",
+    "input[aria-label*='Código']",
+    "input[aria-label*='codigo']",
+    "input[aria-label*='código']",
+    "input[inputmode='numeric']",
+    "input[type='tel']",
+    "input[type='text']",
+)
 
+_ANY_VISIBLE_JS = f"""(selector) => Boolean(selector) && [...document.querySelectorAll(selector)].some(
+  {VISIBLE_ELEMENT_JS}
+)"""
 
-def _login_otp_selectors(config: AppConfig) -> list[str]:
-    return [
-        config.login_otp_input_selector,
-        "input[name='otp']",
-        "input[name='codigo']",
-        "input[name*='codigo']",
-        "input[id*='codigo']",
-        "input[placeholder*='Código']",
-        "input[placeholder*='codigo']",
-        "input[placeholder*='código']",
-        "input[aria-label*='Código']",
-        "input[aria-label*='codigo']",
-        "input[aria-label*='código']",
-        "input[inputmode='numeric']",
-        "input[type='tel']",
-        "input[type='text']",
-    ]
+# Resolves in the browser as soon as a password or OTP field is visible, password first like the probes below.
+_LOGIN_STEP_JS = f"""([password, otp]) => {{
+  const visible = {_ANY_VISIBLE_JS};
+  return visible(password) ? "password" : visible(otp) ? "otp" : null;
+}}"""
 
+_LOGIN_SUBMIT_SETTLED_JS = f"""([host, otp]) => !location.href.includes(host) || ({_ANY_VISIBLE_JS})(otp)"""
 
-def _login_inputs_visible(page: Page, config: AppConfig) -> bool:
+# Only detects which interstitials are on screen; the clicks go through the regular Playwright helpers.
+_INTERSTITIALS_PRESENT_JS = f"""(spec) => {{
+  if (!document.body) return null;
+  const visible = {VISIBLE_ELEMENT_JS};
+  const norm = (value) => (value || "").replace(/\\s+/g, " ").trim().toLowerCase();
+  const pageText = norm(document.body.innerText);
+  const present = spec.filter((item) => {{
+    if (item.requires && !pageText.includes(norm(item.requires))) return false;
+    if (item.dom_selector && [...document.querySelectorAll(item.dom_selector)].some(visible)) return true;
+    return Boolean(norm(item.text)) && pageText.includes(norm(item.text));
+  }});
+  return present.length ? present.map((item) => item.label) : null;
+}}"""
+
+
+@lru_cache(maxsize=16)
+def _with_configured(configured: str, defaults: tuple[str, ...]) -> tuple[str, ...]:
+    # Built once per configured selector; blanks are dropped here so the polling helpers get a clean tuple.
+    return tuple(selector for selector in (configured, *defaults) if selector and selector.strip())
+
+
+def _username_selectors(config: AppConfig) -> tuple[str, ...]:
+    return _with_configured(config.login_username_selector, _USERNAME_SELECTORS)
+
+
+def _password_selectors(config: AppConfig) -> tuple[str, ...]:
+    return _with_configured(config.login_password_selector, _PASSWORD_SELECTORS)
+
+
+def _login_otp_selectors(config: AppConfig) -> tuple[str, ...]:
+    return _with_configured(config.login_otp_input_selector, _LOGIN_OTP_SELECTORS)
+
+
+def _probe_visible(page: Page, selectors: tuple[str, ...]) -> bool:
     try:
-        return any_visible_by_selectors(page, _username_selectors(config), timeout_ms=1200)
+        return any_visible_by_selectors(page, selectors, timeout_ms=1200)
     except PlaywrightError:
         return False
 
 
+def _login_inputs_visible(page: Page, config: AppConfig) -> bool:
+    return _probe_visible(page, _username_selectors(config))
+
+
 def _password_visible(page: Page, config: AppConfig) -> bool:
-    try:
-        return any_visible_by_selectors(page, _password_selectors(config), timeout_ms=1200)
-    except PlaywrightError:
-        return False
+    return _probe_visible(page, _password_selectors(config))
 
 
 def _login_otp_visible(page: Page, config: AppConfig) -> bool:
-    try:
-        return any_visible_by_selectors(page, _login_otp_selectors(config), timeout_ms=1200)
-    except PlaywrightError:
-        return False
+    return _probe_visible(page, _login_otp_selectors(config))
+
+
+def _interstitial_spec(config: AppConfig) -> list[dict[str, str]]:
+    def item(label: str, selector: str, text: str, requires: str = "") -> dict[str, str]:
+        dom_selector = selector if selector and is_dom_css(selector) else ""
+        return {"label": label, "selector": selector, "dom_selector": dom_selector, "text": text, "requires": requires}
+
+    return [
+        item("Cookie banner accepted", config.cookie_accept_selector, config.cookie_accept_text),
+        item(
+            "Age gate confirmed",
+            config.age_gate_confirm_selector,
+            config.age_gate_confirm_text,
+            config.age_gate_prompt_text,
+        ),
+        item("Clicked site entry", config.enter_site_selector, config.enter_site_text),
+    ]
 
 
 def _clear_interstitials(page: Page, config: AppConfig, logger: logging.Logger) -> None:
+    spec = _interstitial_spec(config)
     for _ in range(3):
-        changed = False
-
-        if click_if_present_by_selectors(page, [config.cookie_accept_selector], timeout_ms=1200):
-            logger.info("Cookie banner accepted by selector")
-            changed = True
-        elif click_if_present_by_text(page, config.cookie_accept_text, exact=False, timeout_ms=1200):
-            logger.info("Cookie banner accepted by text")
-            changed = True
+        # One in-page check per pass decides which interstitials to click; absent ones cost no locator waits.
+        try:
+            present = page.wait_for_function(_INTERSTITIALS_PRESENT_JS, arg=spec, timeout=1200).json_value()
+        except PlaywrightError:
+            present = []
 
-        if text_exists(page, config.age_gate_prompt_text, exact=False, timeout_ms=1000):
-            if click_if_present_by_selectors(page, [config.age_gate_confirm_selector], timeout_ms=1200):
-                logger.info("Age gate confirmed by selector")
+        changed = False
+        for entry in spec:
+            # Selectors querySelectorAll cannot run are not covered by the check, so they are always tried.
+            if entry["label"] not in present and not (entry["selector"] and not entry["dom_selector"]):
+                continue
+            if click_if_present_by_selectors(page, [entry["selector"]], timeout_ms=1200):
+                logger.info("%s by selector", entry["label"])
                 changed = True
-            elif click_if_present_by_text(page, config.age_gate_confirm_text, exact=False, timeout_ms=1200):
-                logger.info("Age gate confirmed by text")
+            elif click_if_present_by_text(page, entry["text"], exact=False, timeout_ms=1200):
+                logger.info("%s by text", entry["label"])
                 changed = True
 
-        if click_if_present_by_selectors(page, [config.enter_site_selector], timeout_ms=1200):
-            logger.info("Clicked site entry by selector")
-            changed = True
-        elif click_if_present_by_text(page, config.enter_site_text, exact=False, timeout_ms=1200):
-            logger.info("Clicked site entry by text")
-            changed = True
-
-        if changed:
-            page.wait_for_timeout(600)
+        if not changed:
+            return
+        page.wait_for_timeout(600)
 
 
 def _is_logged_in_session(page: Page, config: AppConfig) -> bool:
     if _login_inputs_visible(page, config) or _password_visible(page, config) or _login_otp_visible(page, config):
         return False
 
-    try:
-        current_url = page.url or ""
-    except PlaywrightError:
-        current_url = ""
-    if "login.caixa.gov.br" in current_url:
+    current_url = _page_url(page)
+    if _LOGIN_HOST in current_url:
         return False
 
     logged_markers = [
@@ -142,56 +200,73 @@ def _is_logged_in_session(page: Page, config: AppConfig) -> bool:
         "[title*='Minha Conta' i]",
     ]
     has_logged_marker = any_visible_by_selectors(page, logged_markers, timeout_ms=1200)
-    has_logged_text = text_exists(page, "Minha Conta", exact=False, timeout_ms=1200) or text_exists(
-        page, "Olá", exact=False, timeout_ms=1200
+    has_account_text, has_greeting, has_login_cta = text_flags(
+        page, ("Minha Conta", "Olá", config.access_login_text or "Acessar")
     )
-    has_login_cta = text_exists(page, config.access_login_text or "Acessar", exact=False, timeout_ms=800)
+    has_logged_text = has_account_text or has_greeting
 
     return (has_logged_marker or has_logged_text) and not has_login_cta
 
 
+def _page_url(page: Page) -> str:
+    try:
+        return page.url or ""
+    except PlaywrightError:
+        return ""
+
+
 def _resolve_active_page(page: Page, logger: logging.Logger) -> Page:
-    pages = [candidate for candidate in page.context.pages if not candidate.is_closed()]
+    # Each page's URL is read once per call and reused by every pass below.
+    pages = [(candidate, _page_url(candidate)) for candidate in page.context.pages if not candidate.is_closed()]
     if not pages:
         raise AutomationError("Browser has no active pages after login transition")
 
     if page.is_closed():
-        next_page = pages[-1]
-        logger.info("Switched to active page after previous page closed: %s", next_page.url)
+        next_page, next_url = pages[-1]
+        logger.info("Switched to active page after previous page closed: %s", next_url)
         return next_page
 
-    try:
-        current_url = page.url or ""
-    except PlaywrightError:
-        current_url = ""
-
-    if current_url and "login.caixa.gov.br" not in current_url:
+    current_url = _page_url(page)
+    if current_url and _LOGIN_HOST not in current_url:
         return page
 
-    for candidate in reversed(pages):
-        if candidate is page:
-            continue
-        try:
-            candidate_url = candidate.url or ""
-        except PlaywrightError:
-            continue
-        if candidate_url and "login.caixa.gov.br" not in candidate_url:
+    for candidate, candidate_url in reversed(pages):
+        if candidate is not page and candidate_url and _LOGIN_HOST not in candidate_url:
             logger.info("Switched to non-login page after transition: %s", candidate_url)
             return candidate
 
-    for candidate in reversed(pages):
-        if candidate is page:
-            continue
-        try:
-            if "login.caixa.gov.br" in candidate.url:
-                logger.info("Switched to login target page: %s", candidate.url)
-                return candidate
-        except PlaywrightError:
-            continue
+    for candidate, candidate_url in reversed(pages):
+        if candidate is not page and _LOGIN_HOST in candidate_url:
+            logger.info("Switched to login target page: %s", candidate_url)
+            return candidate
 
     return page
 
 
+def _wait_briefly(page: Page, timeout_ms: int, event: str = "framenavigated") -> None:
+    # Sleeps up to timeout_ms but wakes as soon as the page navigates.
+    try:
+        page.wait_for_event(event, timeout=timeout_ms)
+    except PlaywrightError:
+        pass
+
+
+def _prompt_login_otp(page: Page, logger: logging.Logger) -> tuple[Page, str | None]:
+    # stdin is read on the prompt reader thread so this thread keeps handling Playwright events and notices if
+    # the login finishes on its own; None means the code is no longer needed.
+    future = prompt_code_async("Enter login email code: ")
+    try:
+        while not future.done():
+            _wait_briefly(page, 1000)
+            page = _resolve_active_page(page, logger)
+            if not _is_login_domain(page):
+                logger.info("Left login domain while waiting for the email code; prompt withdrawn")
+                return page, None
+        return page, future.result()
+    finally:
+        cancel_prompt(future)
+
+
 def _try_click_locator(locator, timeout_ms: int = 2000) -> bool:
     try:
         locator.wait_for(state="visible", timeout=timeout_ms)
@@ -201,9 +276,23 @@ def _try_click_locator(locator, timeout_ms: int = 2000) -> bool:
         return False
 
 
+def _click_role_button_exact_first(page: Page, name: str, timeout_ms: int) -> bool:
+    # One wait covers both matches, but an exact name still wins over a longer label that merely contains it.
+    exact = page.get_by_role("button", name=name, exact=True)
+    either = exact.or_(page.get_by_role("button", name=name)).first
+    try:
+        either.wait_for(state="visible", timeout=timeout_ms)
+        visible_exact = exact.filter(visible=True)
+        target = visible_exact.first if visible_exact.count() > 0 else either
+        target.click(timeout=timeout_ms)
+        return True
+    except (PlaywrightTimeoutError, PlaywrightError):
+        return False
+
+
 def _click_login_next_button(page: Page, config: AppConfig, logger: logging.Logger) -> bool:
-    if config.login_next_selector and config.login_next_selector.strip():
-        if _try_click_locator(page.locator(config.login_next_selector).first, timeout_ms=2500):
+    if config.login_next_selector:
+        if _try_click_locator(first_locator(page, config.login_next_selector), timeout_ms=2500):
             logger.info("Clicked login next by selector")
             return True
 
@@ -215,72 +304,64 @@ def _click_login_next_button(page: Page, config: AppConfig, logger: logging.Logg
             continue
         checked.add(key)
 
-        if _try_click_locator(page.get_by_role("button", name=key, exact=True).first, timeout_ms=2500):
-            logger.info("Clicked login next by role exact text: %s", key)
-            return True
-        if _try_click_locator(page.get_by_role("button", name=key, exact=False).first, timeout_ms=2000):
+        if _click_role_button_exact_first(page, key, timeout_ms=2500):
             logger.info("Clicked login next by role text: %s", key)
             return True
-        if _try_click_locator(page.locator(f"button:has-text('{key}')").first, timeout_ms=2000):
-            logger.info("Clicked login next by button text: %s", key)
-            return True
-        if _try_click_locator(page.locator(f"input[type='submit'][value*='{key}']").first, timeout_ms=2000):
-            logger.info("Clicked login next by submit value: %s", key)
+        if _try_click_locator(
+            first_locator(page, f"button:has-text('{key}'), input[type='submit'][value*='{key}']"), timeout_ms=2000
+        ):
+            logger.info("Clicked login next by button text or submit value: %s", key)
             return True
 
     return False
 
 
 def _click_login_submit_button(page: Page, config: AppConfig, logger: logging.Logger) -> bool:
-    if config.login_submit_selector and config.login_submit_selector.strip():
-        if _try_click_locator(page.locator(config.login_submit_selector).first, timeout_ms=2500):
+    if config.login_submit_selector:
+        if _try_click_locator(first_locator(page, config.login_submit_selector), timeout_ms=2500):
             logger.info("Clicked login submit by selector")
             return True
 
     if _try_click_locator(
-        page.get_by_role("button", name=re.compile(r"entrar|acessar|continuar", re.IGNORECASE)).first,
+        page.get_by_role("button", name=_LOGIN_SUBMIT_REGEX).first,
         timeout_ms=2500,
     ):
         logger.info("Clicked login submit by button role regex")
         return True
 
-    if _try_click_locator(page.locator("button:has-text('Entrar')").first, timeout_ms=2000):
-        logger.info("Clicked login submit by button text")
-        return True
-
-    if _try_click_locator(page.locator("input[type='submit'][value*='Entrar']").first, timeout_ms=2000):
-        logger.info("Clicked login submit by submit input")
+    if _try_click_locator(
+        first_locator(page, "button:has-text('Entrar'), input[type='submit'][value*='Entrar']"), timeout_ms=2000
+    ):
+        logger.info("Clicked login submit by button text or submit input")
         return True
 
     return False
 
 
 def _click_login_otp_submit_button(page: Page, config: AppConfig, logger: logging.Logger) -> bool:
-    if config.login_otp_submit_selector and config.login_otp_submit_selector.strip():
-        if _try_click_locator(page.locator(config.login_otp_submit_selector).first, timeout_ms=2500):
+    if config.login_otp_submit_selector:
+        if _try_click_locator(first_locator(page, config.login_otp_submit_selector), timeout_ms=2500):
             logger.info("Clicked login OTP submit by selector")
             return True
 
     if _try_click_locator(
-        page.get_by_role("button", name=re.compile(r"enviar|confirmar|validar", re.IGNORECASE)).first,
+        page.get_by_role("button", name=_LOGIN_OTP_SUBMIT_REGEX).first,
         timeout_ms=2500,
     ):
         logger.info("Clicked login OTP submit by button role regex")
         return True
 
-    if _try_click_locator(page.locator("button:has-text('Enviar')").first, timeout_ms=2000):
-        logger.info("Clicked login OTP submit by Enviar text")
-        return True
-
-    if _try_click_locator(page.locator("button:has-text('Confirmar')").first, timeout_ms=2000):
-        logger.info("Clicked login OTP submit by Confirmar text")
+    if _try_click_locator(
+        first_locator(page, "button:has-text('Enviar'), button:has-text('Confirmar')"), timeout_ms=2000
+    ):
+        logger.info("Clicked login OTP submit by Enviar/Confirmar text")
         return True
 
     return False
 
 
 def _submit_login_otp(page: Page, config: AppConfig, logger: logging.Logger) -> Page:
-    page.wait_for_timeout(400)
+    _wait_briefly(page, 400, event="domcontentloaded")
     page = _resolve_active_page(page, logger)
 
     if _password_visible(page, config):
@@ -288,12 +369,8 @@ def _submit_login_otp(page: Page, config: AppConfig, logger: logging.Logger) ->
         return page
 
     if not _login_otp_visible(page, config):
-        current_url = ""
-        try:
-            current_url = page.url or ""
-        except PlaywrightError:
-            pass
-        if "login.caixa.gov.br" not in current_url:
+        current_url = _page_url(page)
+        if _LOGIN_HOST not in current_url:
             logger.info("OTP entry auto-completed login flow")
             return page
 
@@ -312,29 +389,50 @@ def _submit_login_otp(page: Page, config: AppConfig, logger: logging.Logger) ->
     raise AutomationError(f"Unable to click login OTP submit button. current_url={page.url}")
 
 
+def _race_login_step(page: Page, config: AppConfig, timeout_ms: int) -> str | None:
+    password_css, password_other = dom_css_union(_password_selectors(config))
+    otp_css, otp_other = dom_css_union(_login_otp_selectors(config))
+    try:
+        handle = page.wait_for_function(_LOGIN_STEP_JS, arg=[password_css, otp_css], timeout=timeout_ms)
+        return handle.json_value()
+    except PlaywrightTimeoutError:
+        pass
+    except PlaywrightError:
+        # Navigation tore down the context or the union did not parse; fall back to the per-selector probes.
+        password_other, otp_other = _password_selectors(config), _login_otp_selectors(config)
+
+    try:
+        if password_other and any_visible_by_selectors(page, password_other, timeout_ms=300):
+            return "password"
+        if otp_other and any_visible_by_selectors(page, otp_other, timeout_ms=300):
+            return "otp"
+    except PlaywrightError:
+        pass
+    return None
+
+
 def _wait_for_login_step(page: Page, config: AppConfig, logger: logging.Logger, timeout_ms: int = 30000) -> tuple[Page, str]:
     deadline = time.monotonic() + (timeout_ms / 1000)
     clicked_receive_code = False
     while time.monotonic() < deadline:
         page = _resolve_active_page(page, logger)
-        if _password_visible(page, config):
+        # Bounded slices so page switches and the receive-code button are still handled between races.
+        remaining_ms = int((deadline - time.monotonic()) * 1000)
+        step = _race_login_step(page, config, timeout_ms=max(1, min(2500, remaining_ms)))
+        if step == "password":
             logger.info("Password field detected")
             return page, "password"
 
-        if _login_otp_visible(page, config):
+        if step == "otp":
             logger.info("Login validation code field detected")
             return page, "otp"
 
         if not clicked_receive_code and _try_click_locator(
-            page.get_by_role("button", name=re.compile(r"receber\s+c[oó]digo", re.IGNORECASE)).first,
+            page.get_by_role("button", name=_RECEIVE_CODE_REGEX).first,
             timeout_ms=1500,
         ):
             clicked_receive_code = True
             logger.info("Clicked login validation button by regex: Receber codigo")
-            page.wait_for_timeout(500)
-            continue
-
-        page.wait_for_timeout(250)
 
     raise AutomationError(f"Login did not advance to password or validation code step after clicking next. current_url={page.url}")
 
@@ -349,32 +447,45 @@ def _wait_for_password_or_login_completion(
             logger.info("Password field detected after OTP submission")
             return page, "password"
 
-        current_url = ""
-        try:
-            current_url = page.url or ""
-        except PlaywrightError:
-            pass
-        if "login.caixa.gov.br" not in current_url:
+        current_url = _page_url(page)
+        if _LOGIN_HOST not in current_url:
             logger.info("Login flow appears complete after OTP, current URL: %s", current_url)
             return page, "done"
 
-        page.wait_for_timeout(250)
+        _wait_briefly(page, 250)
 
     raise AutomationError(f"Login did not complete after OTP submission. current_url={page.url}")
 
 
 def _is_login_domain(page: Page) -> bool:
+    return _LOGIN_HOST in _page_url(page)
+
+
+def _wait_for_login_form(page: Page, config: AppConfig, timeout_ms: int) -> bool:
+    css, others = dom_css_union(_username_selectors(config))
+    if css:
+        try:
+            page.wait_for_function(_ANY_VISIBLE_JS, arg=css, timeout=timeout_ms)
+            return True
+        except PlaywrightError:
+            pass
+    return bool(others) and _probe_visible(page, others)
+
+
+def _wait_after_login_submit(page: Page, config: AppConfig, expect_otp: bool, timeout_ms: int = 15000) -> None:
+    # Waits for what the next step reads: the redirect off the login domain or, after the password, the OTP field.
+    otp_css = dom_css_union(_login_otp_selectors(config))[0] if expect_otp else ""
     try:
-        return "login.caixa.gov.br" in (page.url or "")
+        page.wait_for_function(_LOGIN_SUBMIT_SETTLED_JS, arg=[_LOGIN_HOST, otp_css], timeout=timeout_ms)
     except PlaywrightError:
-        return False
+        pass
 
 
 def _prepare_login_page(page: Page, config: AppConfig, logger: logging.Logger, run_dir: Path) -> None:
     logger.info("Preparing page for login form")
 
     for _ in range(4):
-        if _login_inputs_visible(page, config):
+        if _wait_for_login_form(page, config, timeout_ms=1200):
             logger.info("Login form detected")
             return
 
@@ -393,7 +504,8 @@ def _prepare_login_page(page: Page, config: AppConfig, logger: logging.Logger, r
             logger.info("Clicked login access by text")
             changed = True
 
-        if _login_inputs_visible(page, config):
+        # After a click the form usually arrives with a navigation; wait for it in-page instead of sleeping.
+        if _wait_for_login_form(page, config, timeout_ms=5000 if changed else 1200):
             logger.info("Login form detected")
             return
 
@@ -401,32 +513,36 @@ def _prepare_login_page(page: Page, config: AppConfig, logger: logging.Logger, r
             logger.info("Session became active during login page preparation")
             return
 
-        if changed:
-            page.wait_for_timeout(600)
-
-    shot = save_snapshot(page, run_dir, "login_form_not_visible")
+    shot = save_snapshot_async(page, run_dir, "login_form_not_visible", full=True, fmt="png")
     raise AutomationError(
         f"Login form was not visible after handling interstitials. url={page.url} title={page.title()} screenshot={shot}"
     )
 
 
 def run_login(page: Page, config: AppConfig, logger: logging.Logger, run_dir: Path) -> Page:
+    try:
+        return _run_login(page, config, logger, run_dir)
+    finally:
+        flush_snapshots(run_dir, logger)
+
+
+def _run_login(page: Page, config: AppConfig, logger: logging.Logger, run_dir: Path) -> Page:
     logger.info("Opening base URL")
     page.goto(config.base_url, wait_until="domcontentloaded")
-    save_snapshot(page, run_dir, "home_loaded")
+    save_snapshot_async(page, run_dir, "home_loaded", full=True, fmt="png")
 
     _clear_interstitials(page, config, logger)
     if _is_logged_in_session(page, config):
         logger.info("Session already active; skipping login")
-        save_snapshot(page, run_dir, "login_skipped_session_active")
+        save_snapshot_async(page, run_dir, "login_skipped_session_active")
         return page
 
     _prepare_login_page(page, config, logger, run_dir)
     if _is_logged_in_session(page, config):
         logger.info("Session already active after preparation; skipping login")
-        save_snapshot(page, run_dir, "login_skipped_session_active")
+        save_snapshot_async(page, run_dir, "login_skipped_session_active")
         return page
-    save_snapshot(page, run_dir, "login_ready")
+    save_snapshot_async(page, run_dir, "login_ready")
 
     logger.info("Submitting username and password")
     fill_first_available(
@@ -451,11 +567,13 @@ def run_login(page: Page, config: AppConfig, logger: logging.Logger, run_dir: Pa
             raise AutomationError(f"Unable to click login next button. current_url={page.url}")
 
         page, current_step = _wait_for_login_step(page, config, logger, timeout_ms=30000)
-        save_snapshot(page, run_dir, "login_after_next")
+        save_snapshot_async(page, run_dir, "login_after_next")
 
     if current_step == "otp":
         logger.info("Waiting for login email code")
-        otp = input("Enter login email code: ").strip()
+        page, otp = _prompt_login_otp(page, logger)
+        if otp is None:
+            return page
         if not otp:
             raise AutomationError("Login email OTP cannot be empty")
 
@@ -466,7 +584,7 @@ def run_login(page: Page, config: AppConfig, logger: logging.Logger, run_dir: Pa
             timeout_ms=10000,
         )
         page = _submit_login_otp(page, config, logger)
-        save_snapshot(page, run_dir, "login_otp_submitted")
+        save_snapshot_async(page, run_dir, "login_otp_submitted")
 
         page, after_otp_step = _wait_for_password_or_login_completion(page, config, logger, timeout_ms=30000)
         if after_otp_step == "done":
@@ -497,7 +615,8 @@ def run_login(page: Page, config: AppConfig, logger: logging.Logger, run_dir: Pa
                 logger.info("Login finished while trying post-OTP password submit click")
                 return page
             raise AutomationError(f"Unable to click login submit button after OTP. current_url={page.url}")
-        save_snapshot(page, run_dir, "login_submitted")
+        _wait_after_login_submit(page, config, expect_otp=False)
+        save_snapshot_async(page, run_dir, "login_submitted")
         logger.info("Login step completed after OTP + password")
         return page
 
@@ -513,11 +632,14 @@ def run_login(page: Page, config: AppConfig, logger: logging.Logger, run_dir: Pa
         return page
     if not _click_login_submit_button(page, config, logger):
         raise AutomationError(f"Unable to click login submit button. current_url={page.url}")
-    save_snapshot(page, run_dir, "login_submitted")
+    _wait_after_login_submit(page, config, expect_otp=True)
+    save_snapshot_async(page, run_dir, "login_submitted")
 
     if _login_otp_visible(page, config):
         logger.info("Waiting for login OTP input")
-        otp = input("Enter login email code: ").strip()
+        page, otp = _prompt_login_otp(page, logger)
+        if otp is None:
+            return page
         if not otp:
             raise AutomationError("Login email OTP cannot be empty")
 
@@ -528,7 +650,7 @@ def run_login(page: Page, config: AppConfig, logger: logging.Logger, run_dir: Pa
             timeout_ms=10000,
         )
         page = _submit_login_otp(page, config, logger)
-        save_snapshot(page, run_dir, "login_otp_submitted")
+        save_snapshot_async(page, run_dir, "login_otp_submitted")
 
     if page.url == config.base_url:
         logger.info("Login appears successful")
@@ -1,31 +1,71 @@
 from __future__ import annotations
 
 import logging
+import logging.handlers
+import os
 from pathlib import Path
 
 
-def build_logger(log_file: Path) -> logging.Logger:
+# Deletes every Latin-1 non-digit in C; anything outside Latin-1 is rare enough to filter in Python afterwards.
+_DROP_NON_DIGITS = str.maketrans("", "", "".join(chr(code) for code in range(256) if not chr(code).isdigit()))
+
+
+class _RepeatFilter(logging.Filter):
+    # Drops a record identical to the one just before it, so polling loops don't flood the console.
+    def __init__(self) -> None:
+        super().__init__()
+        self._last: tuple[int, str] | None = None
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        # The rendered message, so records differing only in their (tuple or mapping) args are never merged.
+        key = (record.levelno, record.getMessage())
+        if key == self._last:
+            return False
+        self._last = key
+        return True
+
+
+def build_logger(log_file: Path, tag: str | None = None) -> logging.Logger:
     log_file.parent.mkdir(parents=True, exist_ok=True)
 
-    logger = logging.getLogger("loterias_bot")
+    logger = logging.getLogger(f"loterias_bot.{tag}" if tag else "loterias_bot")
     logger.setLevel(logging.INFO)
-    logger.handlers.clear()
+    logger.propagate = False
+    # Rebuilding for the same file keeps the open handlers instead of closing and reopening the log.
+    resolved = os.path.abspath(log_file)
+    if any(getattr(getattr(handler, "target", None), "baseFilename", None) == resolved for handler in logger.handlers):
+        return logger
+
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+        target = getattr(handler, "target", None)
+        handler.close()
+        if target is not None:
+            target.close()
 
-    formatter = logging.Formatter("%(asctime)s | %(levelname)s | %(message)s")
+    prefix = f"{tag} | " if tag else ""
+    formatter = logging.Formatter(f"%(asctime)s | %(levelname)s | {prefix}%(message)s")
 
     console_handler = logging.StreamHandler()
     console_handler.setFormatter(formatter)
+    console_handler.addFilter(_RepeatFilter())
 
-    file_handler = logging.FileHandler(log_file, encoding="utf-8")
+    file_handler = logging.FileHandler(log_file, encoding="utf-8", delay=True)
     file_handler.setFormatter(formatter)
+    # Buffered so step loops don't write per line; errors flush immediately and logging.shutdown flushes at exit.
+    buffered_file_handler = logging.handlers.MemoryHandler(
+        capacity=200, flushLevel=logging.ERROR, target=file_handler
+    )
 
     logger.addHandler(console_handler)
-    logger.addHandler(file_handler)
+    logger.addHandler(buffered_file_handler)
     return logger
 
 
 def mask_card(card_number: str) -> str:
-    clean = "".join(ch for ch in card_number if ch.isdigit())
+    clean = card_number.translate(_DROP_NON_DIGITS)
+    if not clean.isascii():
+        clean = "".join(ch for ch in clean if ch.isdigit())
     if len(clean) <= 4:
         return "*" * len(clean)
     return "*" * (len(clean) - 4) + clean[-4:]
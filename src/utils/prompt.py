@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import sys
+import threading
+from collections import deque
+from concurrent.futures import Future
+
+# One reader owns stdin and hands each line to the oldest prompt still waiting, so a withdrawn prompt never
+# swallows the answer meant for the next one and no lock is held across a blocking read.
+_PENDING: deque[tuple[str, Future[str]]] = deque()
+_PENDING_LOCK = threading.Lock()
+_READER: threading.Thread | None = None
+_STDIN_CLOSED = False
+
+
+def _tagged(message: str) -> str:
+    thread = threading.current_thread()
+    if thread is not threading.main_thread():
+        message = f"[{thread.name}] {message}"
+    return message
+
+
+def _show_next_locked() -> None:
+    while _PENDING and _PENDING[0][1].cancelled():
+        _PENDING.popleft()
+    if _PENDING:
+        sys.stdout.write(_PENDING[0][0])
+        sys.stdout.flush()
+
+
+def _read_lines() -> None:
+    global _STDIN_CLOSED
+    while True:
+        line = sys.stdin.readline()
+        with _PENDING_LOCK:
+            if not line:
+                _STDIN_CLOSED = True
+                while _PENDING:
+                    _, future = _PENDING.popleft()
+                    if not future.cancelled():
+                        future.set_exception(EOFError("stdin closed while waiting for a code"))
+                return
+            while _PENDING and _PENDING[0][1].cancelled():
+                _PENDING.popleft()
+            if not _PENDING:
+                # Nobody is asking any more, e.g. the code for a prompt that was withdrawn.
+                continue
+            _, future = _PENDING.popleft()
+            future.set_result(line.strip())
+            _show_next_locked()
+
+
+def prompt_code_async(message: str) -> Future[str]:
+    global _READER
+    future: Future[str] = Future()
+    with _PENDING_LOCK:
+        if _STDIN_CLOSED:
+            future.set_exception(EOFError("stdin closed while waiting for a code"))
+            return future
+        _PENDING.append((_tagged(message), future))
+        if len(_PENDING) == 1:
+            _show_next_locked()
+        if _READER is None:
+            # Daemon thread so a failed run does not keep the process alive waiting on stdin.
+            _READER = threading.Thread(target=_read_lines, name="prompt-reader", daemon=True)
+            _READER.start()
+    return future
+
+
+def prompt_code(message: str) -> str:
+    return prompt_code_async(message).result()
+
+
+def cancel_prompt(future: Future[str]) -> None:
+    with _PENDING_LOCK:
+        if future.cancel() and _PENDING and _PENDING[0][1] is future:
+            sys.stdout.write("\n")
+            _show_next_locked()
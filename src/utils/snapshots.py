@@ -1,21 +1,97 @@
 from __future__ import annotations
 
-from datetime import datetime
+import atexit
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
 from pathlib import Path
 
 from playwright.sync_api import Error as PlaywrightError
 from playwright.sync_api import Page
 
+# Playwright's sync API must stay on the calling thread; only the file write is handed off.
+_WRITER = ThreadPoolExecutor(max_workers=2, thread_name_prefix="snapshot-writer")
+_PENDING: dict[Future, Path] = {}
+_PENDING_LOCK = threading.Lock()
+_UNSAFE_ASCII = str.maketrans({chr(code): "_" for code in range(128) if not (chr(code).isalnum() or chr(code) in "-_")})
+# Account threads share this set, so membership checks and inserts go through the lock.
+_CREATED_DIRS: set[Path] = set()
+_CREATED_DIRS_LOCK = threading.Lock()
 
-def save_snapshot(page: Page, run_dir: Path, step_name: str) -> Path | None:
-    safe_step = "".join(ch if ch.isalnum() or ch in {"-", "_"} else "_" for ch in step_name)
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    path = run_dir / "screenshots" / f"{timestamp}_{safe_step}.png"
-    path.parent.mkdir(parents=True, exist_ok=True)
+atexit.register(_WRITER.shutdown)
+
+
+def _snapshot_path(run_dir: Path, step_name: str, fmt: str) -> Path:
+    safe_step = step_name.translate(_UNSAFE_ASCII)
+    if not safe_step.isascii():
+        safe_step = "".join(ch if ch.isalnum() or ch in {"-", "_"} else "_" for ch in safe_step)
+    # Millisecond suffix keeps two snapshots of the same step within one second from overwriting each other.
+    now_ns = time.time_ns()
+    timestamp = f"{time.strftime('%Y%m%d_%H%M%S', time.localtime(now_ns // 1_000_000_000))}_{now_ns // 1_000_000 % 1000:03d}"
+    directory = run_dir / "screenshots"
+    with _CREATED_DIRS_LOCK:
+        if directory not in _CREATED_DIRS:
+            directory.mkdir(parents=True, exist_ok=True)
+            _CREATED_DIRS.add(directory)
+    return directory / f"{timestamp}_{safe_step}.{'jpg' if fmt == 'jpeg' else fmt}"
+
+
+def _capture(page: Page, full: bool, fmt: str) -> bytes:
+    # Step shots are viewport JPEGs; full-page PNG is kept for the frames worth reading pixel by pixel.
+    if fmt == "jpeg":
+        return page.screenshot(type="jpeg", quality=60, full_page=full)
+    return page.screenshot(type=fmt, full_page=full)
+
+
+def save_snapshot(page: Page, run_dir: Path, step_name: str, *, full: bool = False, fmt: str = "jpeg") -> Path | None:
+    if page.is_closed():
+        return None
+    path = _snapshot_path(run_dir, step_name, fmt)
+    try:
+        path.write_bytes(_capture(page, full, fmt))
+    except PlaywrightError:
+        return None
+    return path
+
+
+def _write_failure(future: Future) -> BaseException | None:
+    return None if future.cancelled() else future.exception()
+
+
+def _settle(future: Future) -> None:
+    # Failed writes stay pending so flush_snapshots can report them through the owning account's logger.
+    if _write_failure(future) is None:
+        with _PENDING_LOCK:
+            _PENDING.pop(future, None)
+
+
+def save_snapshot_async(
+    page: Page, run_dir: Path, step_name: str, *, full: bool = False, fmt: str = "jpeg"
+) -> Path | None:
     if page.is_closed():
         return None
+    path = _snapshot_path(run_dir, step_name, fmt)
     try:
-        page.screenshot(path=str(path), full_page=True)
+        data = _capture(page, full, fmt)
     except PlaywrightError:
         return None
+    future = _WRITER.submit(path.write_bytes, data)
+    with _PENDING_LOCK:
+        _PENDING[future] = path
+    future.add_done_callback(_settle)
     return path
+
+
+def flush_snapshots(run_dir: Path, logger: logging.Logger) -> list[tuple[Path, BaseException]]:
+    # Only this run directory's writes: account threads share the writer, and each logs its own failures.
+    with _PENDING_LOCK:
+        pending = {future: path for future, path in _PENDING.items() if run_dir in path.parents}
+    wait(pending)
+    with _PENDING_LOCK:
+        for future in pending:
+            _PENDING.pop(future, None)
+    failures = [(path, error) for future, path in pending.items() if (error := _write_failure(future)) is not None]
+    for path, error in failures:
+        logger.warning("Could not write snapshot %s: %s", path, error)
+    return failures
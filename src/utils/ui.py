@@ -1,6 +1,9 @@
 from __future__ import annotations
 
-from typing import Iterable
+import re
+from functools import lru_cache
+from typing import Callable, Iterable, Sequence, TypeVar
+from weakref import WeakKeyDictionary
 
 from playwright.sync_api import Error as PlaywrightError
 from playwright.sync_api import Locator, Page, TimeoutError as PlaywrightTimeoutError
@@ -8,34 +11,153 @@ from playwright.sync_api import Locator, Page, TimeoutError as PlaywrightTimeout
 from ..errors import AutomationError
 
 
-def _first_non_empty(values: Iterable[str]) -> list[str]:
-    return [value for value in values if value and value.strip()]
+# Locators are lazy and re-resolve on every action, so one per (page, key) survives navigations.
+_LOCATOR_CACHE: WeakKeyDictionary[Page, dict[str, object]] = WeakKeyDictionary()
+_T = TypeVar("_T")
 
+_PLAYWRIGHT_PSEUDO_REGEX = re.compile(
+    r":(?:has-text|text|text-is|text-matches|visible|nth-match|near|left-of|right-of|above|below)\b"
+)
 
-def visible_locator_by_selectors(page: Page, selectors: Iterable[str], timeout_ms: int = 2000) -> Locator:
-    for selector in _first_non_empty(selectors):
-        locator = page.locator(selector).first
+# Shared in-page visibility test for snippets that query the DOM directly instead of going through a Locator.
+VISIBLE_ELEMENT_JS = '(el) => el.getClientRects().length > 0 && getComputedStyle(el).visibility !== "hidden"'
+
+_TEXT_FLAGS_JS = """(needles) => {
+  const norm = (value) => (value || "").replace(/\\s+/g, " ").trim().toLowerCase();
+  const text = norm(document.body ? document.body.innerText : "");
+  return needles.map((needle) => Boolean(norm(needle)) && text.includes(norm(needle)));
+}"""
+
+_DROP_NON_MONEY = str.maketrans("", "", "".join(chr(code) for code in range(256) if not (chr(code).isdigit() or chr(code) == ",")))
+
+
+def _first_non_empty(values: Iterable[str]) -> tuple[str, ...]:
+    return tuple(value for value in values if value and value.strip())
+
+
+def cached_locator(page: Page, key: str, factory: Callable[[], _T]) -> _T:
+    per_page = _LOCATOR_CACHE.setdefault(page, {})
+    if key not in per_page:
+        per_page[key] = factory()
+    return per_page[key]
+
+
+def first_locator(page: Page, selector: str) -> Locator:
+    return cached_locator(page, selector, lambda: page.locator(selector).first)
+
+
+def _first_in(scope: Page | Locator, selector: str) -> Locator:
+    # Only pages are cached: scoped locators (a modal, a row) are short-lived and keyed by nothing stable.
+    if isinstance(scope, Page):
+        return first_locator(scope, selector)
+    return scope.locator(selector).first
+
+
+def _first_text_locator(page: Page, text: str, exact: bool) -> Locator:
+    key = f"text:{'exact' if exact else 'partial'}:{text}"
+    return cached_locator(page, key, lambda: page.get_by_text(text, exact=exact).first)
+
+
+def is_plain_css(selector: str) -> bool:
+    return not (selector.startswith(("xpath=", "text=", "//", "(")) or ">>" in selector or "," in selector)
+
+
+def is_dom_css(selector: str) -> bool:
+    # Stricter than is_plain_css: safe for document.querySelectorAll, so no Playwright-only pseudo-classes.
+    return is_plain_css(selector) and _PLAYWRIGHT_PSEUDO_REGEX.search(selector) is None
+
+
+@lru_cache(maxsize=64)
+def _partition_css(selectors: tuple[str, ...], dom_only: bool) -> tuple[tuple[str, ...], tuple[str, ...]]:
+    # Callers pass tuple(selectors), so repeated selector lists are cleaned and partitioned only once.
+    is_css = is_dom_css if dom_only else is_plain_css
+    cleaned = tuple(selector.strip() for selector in _first_non_empty(selectors))
+    return tuple(selector for selector in cleaned if is_css(selector)), tuple(
+        selector for selector in cleaned if not is_css(selector)
+    )
+
+
+@lru_cache(maxsize=64)
+def _split_css(selectors: tuple[str, ...]) -> tuple[tuple[str, ...], tuple[str, ...], str]:
+    css, others = _partition_css(selectors, False)
+    return css, others, ", ".join(f"{selector}:visible" for selector in css)
+
+
+@lru_cache(maxsize=64)
+def dom_css_union(selectors: tuple[str, ...]) -> tuple[str, tuple[str, ...]]:
+    # For document.querySelectorAll in page scripts: the joined DOM-safe selectors, plus the rest for Locators.
+    css, others = _partition_css(selectors, True)
+    return ", ".join(css), others
+
+
+def _wait_css_union(scope: Page | Locator, union: str, timeout_ms: int) -> bool | None:
+    # One wait for the whole CSS group; None means the union itself was rejected and the group must be walked.
+    try:
+        _first_in(scope, union).wait_for(state="visible", timeout=timeout_ms)
+        return True
+    except PlaywrightTimeoutError:
+        return False
+    except PlaywrightError:
+        return None
+
+
+def _wait_each(scope: Page | Locator, selectors: tuple[str, ...], timeout_ms: int) -> Locator | None:
+    for selector in selectors:
+        locator = _first_in(scope, selector)
         try:
             locator.wait_for(state="visible", timeout=timeout_ms)
             return locator
         except PlaywrightTimeoutError:
             continue
-    raise AutomationError(f"No visible element found for selectors: {list(_first_non_empty(selectors))}")
+    return None
 
 
-def find_visible_locator_by_selectors(page: Page, selectors: Iterable[str], timeout_ms: int = 1200) -> Locator | None:
-    for selector in _first_non_empty(selectors):
-        locator = page.locator(selector).first
+def _resolve_visible_css(scope: Page | Locator, css: tuple[str, ...]) -> Locator | None:
+    for selector in css:
+        locator = _first_in(scope, f"{selector}:visible")
         try:
-            locator.wait_for(state="visible", timeout=timeout_ms)
-            return locator
-        except PlaywrightTimeoutError:
+            if locator.count() > 0:
+                return locator
+        except PlaywrightError:
             continue
     return None
 
 
+def visible_locator_by_selectors(page: Page, selectors: Iterable[str], timeout_ms: int = 2000) -> Locator:
+    selectors = tuple(selectors)
+    locator = find_visible_locator_by_selectors(page, selectors, timeout_ms=timeout_ms)
+    if locator is None:
+        raise AutomationError(f"No visible element found for selectors: {list(_first_non_empty(selectors))}")
+    return locator
+
+
+def find_visible_locator_by_selectors(
+    scope: Page | Locator, selectors: Iterable[str], timeout_ms: int = 1200
+) -> Locator | None:
+    css, others, union = _split_css(tuple(selectors))
+    if css:
+        found = _wait_css_union(scope, union, timeout_ms)
+        if found is None:
+            locator = _wait_each(scope, css, timeout_ms)
+            if locator is not None:
+                return locator
+        elif found:
+            # Resolve by selector priority without further waits.
+            locator = _resolve_visible_css(scope, css)
+            if locator is not None:
+                return locator
+    return _wait_each(scope, others, timeout_ms)
+
+
+def first_visible_of(*locators: Locator) -> Locator:
+    union = locators[0]
+    for locator in locators[1:]:
+        union = union.or_(locator)
+    return union.filter(visible=True).first
+
+
 def click_by_text(page: Page, text: str, exact: bool = False, timeout_ms: int = 5000) -> None:
-    locator = page.get_by_text(text, exact=exact).first
+    locator = _first_text_locator(page, text, exact)
     locator.wait_for(state="visible", timeout=timeout_ms)
     locator.click()
 
@@ -43,7 +165,7 @@ def click_by_text(page: Page, text: str, exact: bool = False, timeout_ms: int =
 def click_if_present_by_text(page: Page, text: str, exact: bool = False, timeout_ms: int = 1200) -> bool:
     if not text or not text.strip():
         return False
-    locator = page.get_by_text(text, exact=exact).first
+    locator = _first_text_locator(page, text, exact)
     try:
         locator.wait_for(state="visible", timeout=timeout_ms)
     except PlaywrightTimeoutError:
@@ -67,7 +189,12 @@ def click_if_present_by_selectors(page: Page, selectors: Iterable[str], timeout_
 
 
 def any_visible_by_selectors(page: Page, selectors: Iterable[str], timeout_ms: int = 1200) -> bool:
-    return find_visible_locator_by_selectors(page, selectors, timeout_ms=timeout_ms) is not None
+    css, others, union = _split_css(tuple(selectors))
+    if css:
+        found = _wait_css_union(page, union, timeout_ms)
+        if found or (found is None and _wait_each(page, css, timeout_ms) is not None):
+            return True
+    return _wait_each(page, others, timeout_ms) is not None
 
 
 def click_first_available(page: Page, selectors: Iterable[str], fallback_text: str | None = None, exact_text: bool = False) -> None:
@@ -88,11 +215,25 @@ def fill_first_available(page: Page, value: str, selectors: Iterable[str], timeo
 
 def text_exists(page: Page, text: str, exact: bool = False, timeout_ms: int = 5000) -> bool:
     try:
-        page.get_by_text(text, exact=exact).first.wait_for(state="visible", timeout=timeout_ms)
+        if timeout_ms <= 0:
+            return _first_text_locator(page, text, exact).is_visible()
+        _first_text_locator(page, text, exact).wait_for(state="visible", timeout=timeout_ms)
         return True
     except (PlaywrightTimeoutError, PlaywrightError):
         return False
 
 
+def text_flags(page: Page, texts: Sequence[str]) -> list[bool]:
+    # One rendered-text scan for several case-insensitive needles; blank needles are always False.
+    try:
+        return page.evaluate(_TEXT_FLAGS_JS, list(texts))
+    except PlaywrightError:
+        return [False] * len(texts)
+
+
 def normalize_money(value: str) -> str:
-    return "".join(ch for ch in value if ch.isdigit() or ch == ",")
+    clean = value.translate(_DROP_NON_MONEY)
+    if not clean.isascii():
+        clean = "".join(ch for ch in clean if ch.isdigit() or ch == ",")
+    return clean
+